@@ -1,14 +1,12 @@
 # app.py
 import streamlit as st
 from streamlit_option_menu import option_menu
-from streamlit_ace import st_ace
-import streamlit_antd_components as sac # For specific buttons like Save/Delete group
-import time
+# streamlit_ace and streamlit_antd_components are imported lazily in render_code_editor()
 from pathlib import Path
 
 # --- Project-specific Imports ---
 from config.settings import (
-    ACE_DEFAULT_THEME, ACE_DEFAULT_KEYBINDING, ACE_FONT_SIZE, ACE_TAB_SIZE, ACE_WRAP_LINES,
+    ACE_DEFAULT_THEME, ACE_DEFAULT_KEYBINDING, ACE_FONT_SIZE, ACE_TAB_SIZE, ACE_WRAP_LINES, CHAT_HISTORY_WINDOW,
     GEMINI_MODEL_NAME, GEMINI_SYSTEM_PROMPT_TEMPLATE, WORKSPACE_DIR, GOOGLE_API_KEY # <-- CORRECTED: Added GOOGLE_API_KEY
 )
 from utils.session_manager import initialize_session_state
@@ -18,7 +16,7 @@ from utils.file_utils import (
 from services.gemini_service import (
     ask_gemini_ai, parse_and_execute_ai_commands
 )
-from services.preview_service import start_preview, stop_preview
+from services.preview_service import start_preview, stop_preview, read_preview_output
 from utils.logger import app_logger
 
 # --- Page Configuration (Must be the first Streamlit command) ---
@@ -29,11 +27,17 @@ st.set_page_config(
 )
 
 # --- Load Custom CSS ---
+@st.cache_data(show_spinner=False)
+def _read_css(file_path: str, mtime_ns: int) -> str:
+    """Reads a CSS file. Cached per file modification time, so edits are still picked up."""
+    with open(file_path, "r") as f:
+        return f.read()
+
 def load_css(file_path: str = "style.css"):
     """Loads custom CSS from a file into the Streamlit app."""
     try:
-        with open(file_path, "r") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        css = _read_css(file_path, Path(file_path).stat().st_mtime_ns)
+        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
         app_logger.info(f"Custom CSS '{file_path}' loaded successfully.")
     except FileNotFoundError:
         app_logger.warning(f"CSS file '{file_path}' not found. Using default styles.")
@@ -46,6 +50,33 @@ load_css() # Load custom styles defined in style.css
 initialize_session_state()
 # Note: Gemini client is initialized lazily by gemini_service when first needed.
 
+# --- Chat Display Lookup Tables ---
+CHAT_AVATARS = {"user": "🧑‍💻", "assistant": "🤖"}
+COMMAND_STATUS_ICONS = {"success": "✅", "chat message": "💬"}
+
+# --- AI Command Summary Formatting ---
+def format_create_update_summary(command: dict, status: str, icon: str) -> str:
+    """Formats the chat summary line for a create_update command."""
+    return f"{icon} **{status.capitalize()}:** `{command.get('filename')}` (Created/Updated)\n"
+
+def format_delete_summary(command: dict, status: str, icon: str) -> str:
+    """Formats the chat summary line for a delete command."""
+    return f"{icon} **{status.capitalize()}:** `{command.get('filename')}` (Deleted)\n"
+
+def format_unknown_action_summary(command: dict, status: str, icon: str) -> str:
+    """Formats the chat summary line for a command with an unrecognized action."""
+    return f"⚠️ **Unknown Action:** `{command.get('action')}` for `{command.get('filename')}`\n"
+
+COMMAND_SUMMARY_FORMATTERS = {
+    "create_update": format_create_update_summary,
+    "delete": format_delete_summary,
+}
+
+# --- Chat History Windowing ---
+def show_earlier_messages():
+    """Expands the rendered chat history window by another page of messages."""
+    st.session_state.chat_history_window += CHAT_HISTORY_WINDOW
+
 # --- Main Application UI ---
 st.title("🤖 AI Streamlit App Generator (Pro Edition)")
 st.markdown("---")
@@ -65,15 +96,24 @@ with st.sidebar:
         if not st.session_state.messages:
             st.info("Chat history is empty. Type your instructions below to get started with the AI.")
         else:
-            for message_idx, message in enumerate(st.session_state.messages):
+            # Render only the most recent messages; the full history is still sent to the AI.
+            hidden_message_count = max(len(st.session_state.messages) - st.session_state.chat_history_window, 0)
+            if hidden_message_count:
+                st.button(
+                    f"Load earlier messages ({hidden_message_count} hidden)",
+                    on_click=show_earlier_messages,
+                    use_container_width=True,
+                    key="load_earlier_messages_button"
+                )
+
+            visible_messages = st.session_state.messages[hidden_message_count:]
+            for message in visible_messages:
                 role = message["role"]
                 content = message["content"]
-                avatar = "🧑‍💻" if role == "user" else "🤖"
-
-                with st.chat_message(role, avatar=avatar):
+                with st.chat_message(role, avatar=CHAT_AVATARS.get(role, "🤖")):
                     if role == "assistant" and isinstance(content, list): # AI commands
                         # Format AI's command list for display
-                        file_actions_summary = ""
+                        file_action_lines = []
                         chat_responses = []
                         code_snippets = []
 
@@ -81,36 +121,33 @@ with st.sidebar:
                             if not isinstance(command, dict): continue
 
                             action = command.get("action")
-                            filename = command.get("filename")
                             cmd_content = command.get("content") # Content for create_update or chat
-                            status = command.get("status", "processed") # Get status if available
-
-                            icon = "📝"
-                            if status == 'success': icon = "✅"
-                            elif 'failed' in status: icon = "❌"
-                            elif status == 'chat message': icon = "💬"
+                            if action == "chat":
+                                chat_responses.append(str(cmd_content or "..."))
+                                continue
 
+                            status = command.get("status", "processed") # Get status if available
+                            icon = COMMAND_STATUS_ICONS.get(status) or ("❌" if 'failed' in status else "📝")
+                            format_summary = COMMAND_SUMMARY_FORMATTERS.get(action, format_unknown_action_summary)
+                            file_action_lines.append(format_summary(command, status, icon))
 
-                            if action == "create_update":
-                                file_actions_summary += f"{icon} **{status.capitalize()}:** `{filename}` (Created/Updated)\n"
-                                if cmd_content and status == 'success': # Show snippet only on success
-                                    code_snippets.append({"filename": filename, "content": cmd_content})
-                            elif action == "delete":
-                                file_actions_summary += f"{icon} **{status.capitalize()}:** `{filename}` (Deleted)\n"
-                            elif action == "chat":
-                                chat_responses.append(str(cmd_content or "..."))
-                            else: # Unknown action
-                                file_actions_summary += f"⚠️ **Unknown Action:** `{action}` for `{filename}`\n"
+                            if action == "create_update" and cmd_content and status == 'success': # Show snippet only on success
+                                code_snippets.append({"filename": command.get("filename"), "content": cmd_content})
 
-                        full_display_text = (file_actions_summary + "\n".join(chat_responses)).strip()
+                        full_display_text = ("".join(file_action_lines) + "\n".join(chat_responses)).strip()
                         if full_display_text:
                             st.markdown(full_display_text)
                         elif not code_snippets: # If no text and no snippets
                              st.markdown("(AI performed an action without textual output)")
 
-                        for i, snippet in enumerate(code_snippets):
-                            with st.expander(f"View AI-generated code for `{snippet['filename']}`", expanded=False):
-                                st.code(snippet['content'], language="python", key=f"ai_code_{message_idx}_{i}")
+                        if code_snippets:
+                            # One expander and one code block per message, with a header comment per file
+                            snippet_filenames = ", ".join(f"`{snippet['filename']}`" for snippet in code_snippets)
+                            combined_code = "\n\n".join(
+                                f"# === {snippet['filename']} ===\n{snippet['content']}" for snippet in code_snippets
+                            )
+                            with st.expander(f"View AI-generated code for {snippet_filenames}", expanded=False):
+                                st.code(combined_code, language="python")
 
                     elif isinstance(content, str): # User message or simple AI chat
                         st.markdown(content)
@@ -125,21 +162,32 @@ with st.sidebar:
         st.session_state.ai_is_thinking = True # Set thinking flag
         st.session_state.messages.append({"role": "user", "content": user_prompt})
         app_logger.info(f"User prompt: {user_prompt}")
-        st.rerun() # Rerun to show user message and spinner immediately
+        # Render the new message in place instead of rerunning the whole script first
+        with chat_container:
+            with st.chat_message("user", avatar=CHAT_AVATARS["user"]):
+                st.markdown(user_prompt)
 
     if st.session_state.ai_is_thinking and st.session_state.messages[-1]["role"] == "user":
-        with st.spinner("🧠 AI is thinking... Please wait."):
-            current_files = get_workspace_python_files(WORKSPACE_DIR)
-            app_logger.debug(f"Files for AI context: {current_files}")
-
-            # Send the *entire* chat history (including the latest user prompt) to the AI
-            ai_response_text = ask_gemini_ai(st.session_state.messages, current_files)
-            app_logger.debug(f"Raw AI response: {ai_response_text}")
-
-            # Parse the AI's response and execute file commands
-            # This function now handles session state updates for editor if active file changes
-            ai_commands_executed = parse_and_execute_ai_commands(ai_response_text)
-            app_logger.info(f"AI commands executed: {ai_commands_executed}")
+        with chat_container:
+            with st.chat_message("assistant", avatar=CHAT_AVATARS["assistant"]):
+                stream_placeholder = st.empty()
+                stream_placeholder.caption("🧠 AI is thinking... Please wait.")
+
+                current_files = get_workspace_python_files(WORKSPACE_DIR)
+                app_logger.debug(f"Files for AI context: {current_files}")
+
+                # Send the *entire* chat history (including the latest user prompt) to the AI.
+                # The response is streamed into the placeholder as it arrives.
+                ai_response_text = ask_gemini_ai(
+                    st.session_state.messages, current_files,
+                    on_chunk=lambda partial_text: stream_placeholder.code(partial_text, language="json")
+                )
+                app_logger.debug(f"Raw AI response: {ai_response_text}")
+
+        # Parse the AI's response (only once the stream has ended) and execute file commands
+        # This function now handles session state updates for editor if active file changes
+        ai_commands_executed = parse_and_execute_ai_commands(ai_response_text)
+        app_logger.info(f"AI commands executed: {ai_commands_executed}")
 
         st.session_state.messages.append({"role": "assistant", "content": ai_commands_executed})
         st.session_state.ai_is_thinking = False # Reset thinking flag
@@ -160,6 +208,109 @@ with st.sidebar:
         icon="⚠️"
     )
 
+# --- Code Editor (Fragment) ---
+# Runs as a fragment so typing, saving and delete confirmation only rerun the editor column,
+# not the chat sidebar and file list.
+@st.fragment
+def render_code_editor():
+    """Renders the Ace code editor for the selected file along with its Save/Delete actions."""
+    # Imported here so the component packages are only loaded once the editor is first shown
+    from streamlit_ace import st_ace
+    import streamlit_antd_components as sac # For specific buttons like Save/Delete group
+
+    st.subheader("Code Editor")
+    selected_filename_for_editor = st.session_state.selected_file
+
+    if selected_filename_for_editor:
+        st.caption(f"Currently editing: `{selected_filename_for_editor}`")
+
+        editor_current_text = st_ace(
+            value=st.session_state.get('editor_unsaved_content', ''), # Show unsaved content
+            language="python",
+            theme=ACE_DEFAULT_THEME,
+            keybinding=ACE_DEFAULT_KEYBINDING,
+            font_size=ACE_FONT_SIZE,
+            tab_size=ACE_TAB_SIZE,
+            wrap=ACE_WRAP_LINES,
+            auto_update=False, # Manual update via session state to control reruns
+            height=500, # Set a fixed height for the editor
+            key=f"ace_editor_{selected_filename_for_editor}" # Unique key for editor state
+        )
+
+        # Keep the latest editor text so it survives reruns. No rerun is needed here:
+        # the unsaved-changes state below is derived from the text returned in this run.
+        st.session_state.editor_unsaved_content = editor_current_text
+
+        has_unsaved_changes = (editor_current_text != st.session_state.last_saved_content)
+        if has_unsaved_changes:
+            st.warning("You have unsaved changes.", icon="⚠️")
+
+        # --- Editor Action Buttons (Save, Delete) ---
+        # Using streamlit-antd-components for grouped buttons with icons
+        editor_buttons_items = [
+            sac.ButtonsItem(label="Save Changes", icon="save", disabled=not has_unsaved_changes),
+            sac.ButtonsItem(label="Delete File", icon="delete", color="red"), # Antd 'delete' icon
+        ]
+        clicked_editor_button_label = sac.buttons(
+            items=editor_buttons_items, index=None, format_func='title',
+            align='end', size='small', return_index=False, # Return label
+            key="editor_action_buttons"
+        )
+
+        if clicked_editor_button_label == "Save Changes":
+            if save_file(selected_filename_for_editor, editor_current_text, WORKSPACE_DIR):
+                st.session_state.file_content_on_load = editor_current_text # Update baseline
+                st.session_state.last_saved_content = editor_current_text   # Mark as saved
+                st.toast(f"Saved: `{selected_filename_for_editor}`", icon="💾")
+                app_logger.info(f"User saved file: {selected_filename_for_editor}")
+                st.rerun(scope="fragment") # Rerun the editor to update button state (disable save)
+            # else: save_file already shows st.error and logs
+
+        elif clicked_editor_button_label == "Delete File":
+            # Confirmation for delete
+            if 'confirm_delete_pending' not in st.session_state:
+                st.session_state.confirm_delete_pending = True
+                st.rerun(scope="fragment") # Rerun the editor to show confirmation
+
+        if st.session_state.get('confirm_delete_pending'):
+            st.warning(f"Are you sure you want to delete `{selected_filename_for_editor}`? This cannot be undone.")
+            confirm_col, cancel_col = st.columns(2)
+            with confirm_col:
+                if st.button(f"Yes, Delete `{selected_filename_for_editor}`", type="primary", use_container_width=True, key="confirm_delete_yes"):
+                    if delete_file_from_workspace(selected_filename_for_editor, WORKSPACE_DIR):
+                        app_logger.info(f"User deleted file: {selected_filename_for_editor}")
+                        # If the deleted file was being previewed, stop the preview
+                        if st.session_state.preview_file == selected_filename_for_editor:
+                            stop_preview() # This clears preview state
+
+                        # Clear editor state as file is gone
+                        st.session_state.selected_file = None
+                        st.session_state.file_content_on_load = ""
+                        st.session_state.editor_unsaved_content = ""
+                        st.session_state.last_saved_content = ""
+                    # else: delete_file_from_workspace shows errors
+                    del st.session_state.confirm_delete_pending
+                    st.rerun() # Full rerun to update file list and editor view
+            with cancel_col:
+                if st.button("Cancel Deletion", use_container_width=True, key="confirm_delete_no"):
+                    del st.session_state.confirm_delete_pending
+                    st.rerun(scope="fragment")
+
+
+    else: # No file selected for editor
+        st.info("Select a Python file from the list on the left to view or edit its content.")
+        # Display a read-only placeholder in the editor area
+        st_ace(
+            value="# No file selected.\n\n# Please choose a file from the 'Project Files' list.",
+            language="python",
+            theme=ACE_DEFAULT_THEME,
+            keybinding=ACE_DEFAULT_KEYBINDING,
+            font_size=ACE_FONT_SIZE,
+            readonly=True,
+            height=500,
+            key="ace_editor_placeholder"
+        )
+
 # --- Main Area Tabs ---
 selected_tab = option_menu(
     menu_title=None, # Required but can be None
@@ -191,10 +342,9 @@ if selected_tab == "Workspace & Editor":
 
         # Dropdown for file selection
         # Add a "None" or "Select a file" option if desired, or default to first file
-        select_options = ["--- Select a file ---"] + python_files
-        current_selection_idx = 0
-        if st.session_state.selected_file and st.session_state.selected_file in select_options:
-            current_selection_idx = select_options.index(st.session_state.selected_file)
+        select_options = ("--- Select a file ---", *python_files)
+        option_idx_by_filename = {filename: idx for idx, filename in enumerate(python_files, start=1)}
+        current_selection_idx = option_idx_by_filename.get(st.session_state.selected_file, 0)
 
         selected_option = st.selectbox(
             "Edit file:",
@@ -207,122 +357,23 @@ if selected_tab == "Workspace & Editor":
         # Handle file selection change
         newly_selected_filename = selected_option if selected_option != "--- Select a file ---" else None
         if newly_selected_filename != st.session_state.selected_file:
-            st.session_state.selected_file = newly_selected_filename
             app_logger.info(f"User selected file: {newly_selected_filename}")
+            file_content = "" # "--- Select a file ---" chosen
             if newly_selected_filename:
                 file_content = read_file(newly_selected_filename, WORKSPACE_DIR)
                 if file_content is None: # File might have been deleted externally or read error
                     file_content = f"# ERROR: Could not read file '{newly_selected_filename}'. It might have been deleted."
                     st.error(f"Could not load '{newly_selected_filename}'.")
-                st.session_state.file_content_on_load = file_content
-                st.session_state.editor_unsaved_content = file_content
-                st.session_state.last_saved_content = file_content
-            else: # "--- Select a file ---" chosen
-                st.session_state.file_content_on_load = ""
-                st.session_state.editor_unsaved_content = ""
-                st.session_state.last_saved_content = ""
+            st.session_state.update({
+                "selected_file": newly_selected_filename,
+                "file_content_on_load": file_content,
+                "editor_unsaved_content": file_content,
+                "last_saved_content": file_content,
+            })
             st.rerun() # Rerun to load new file into editor
 
     with editor_col:
-        st.subheader("Code Editor")
-        selected_filename_for_editor = st.session_state.selected_file
-
-        if selected_filename_for_editor:
-            st.caption(f"Currently editing: `{selected_filename_for_editor}`")
-
-            editor_current_text = st_ace(
-                value=st.session_state.get('editor_unsaved_content', ''), # Show unsaved content
-                language="python",
-                theme=ACE_DEFAULT_THEME,
-                keybinding=ACE_DEFAULT_KEYBINDING,
-                font_size=ACE_FONT_SIZE,
-                tab_size=ACE_TAB_SIZE,
-                wrap=ACE_WRAP_LINES,
-                auto_update=False, # Manual update via session state to control reruns
-                height=500, # Set a fixed height for the editor
-                key=f"ace_editor_{selected_filename_for_editor}" # Unique key for editor state
-            )
-
-            # Update session state if editor text changes (user typing)
-            if editor_current_text != st.session_state.editor_unsaved_content:
-                st.session_state.editor_unsaved_content = editor_current_text
-                # No rerun here to allow smooth typing; rerun on button actions or explicit triggers
-                # However, to update "unsaved changes" status, a rerun is needed.
-                # This can be a bit jumpy. Consider debouncing or a dedicated "check changes" button.
-                # For now, let's rerun to update the save button state.
-                st.rerun()
-
-
-            has_unsaved_changes = (editor_current_text != st.session_state.last_saved_content)
-            if has_unsaved_changes:
-                st.warning("You have unsaved changes.", icon="⚠️")
-
-            # --- Editor Action Buttons (Save, Delete) ---
-            # Using streamlit-antd-components for grouped buttons with icons
-            editor_buttons_items = [
-                sac.ButtonsItem(label="Save Changes", icon="save", disabled=not has_unsaved_changes),
-                sac.ButtonsItem(label="Delete File", icon="delete", color="red"), # Antd 'delete' icon
-            ]
-            clicked_editor_button_label = sac.buttons(
-                items=editor_buttons_items, index=None, format_func='title',
-                align='end', size='small', return_index=False, # Return label
-                key="editor_action_buttons"
-            )
-
-            if clicked_editor_button_label == "Save Changes":
-                if save_file(selected_filename_for_editor, editor_current_text, WORKSPACE_DIR):
-                    st.session_state.file_content_on_load = editor_current_text # Update baseline
-                    st.session_state.last_saved_content = editor_current_text   # Mark as saved
-                    st.toast(f"Saved: `{selected_filename_for_editor}`", icon="💾")
-                    app_logger.info(f"User saved file: {selected_filename_for_editor}")
-                    time.sleep(0.5) # Let toast show
-                    st.rerun() # Rerun to update button state (disable save)
-                # else: save_file already shows st.error and logs
-
-            elif clicked_editor_button_label == "Delete File":
-                # Confirmation for delete
-                if 'confirm_delete_pending' not in st.session_state:
-                    st.session_state.confirm_delete_pending = True
-                    st.rerun() # Rerun to show confirmation
-
-            if st.session_state.get('confirm_delete_pending'):
-                st.warning(f"Are you sure you want to delete `{selected_filename_for_editor}`? This cannot be undone.")
-                confirm_col, cancel_col = st.columns(2)
-                with confirm_col:
-                    if st.button(f"Yes, Delete `{selected_filename_for_editor}`", type="primary", use_container_width=True, key="confirm_delete_yes"):
-                        if delete_file_from_workspace(selected_filename_for_editor, WORKSPACE_DIR):
-                            app_logger.info(f"User deleted file: {selected_filename_for_editor}")
-                            # If the deleted file was being previewed, stop the preview
-                            if st.session_state.preview_file == selected_filename_for_editor:
-                                stop_preview() # This clears preview state
-
-                            # Clear editor state as file is gone
-                            st.session_state.selected_file = None
-                            st.session_state.file_content_on_load = ""
-                            st.session_state.editor_unsaved_content = ""
-                            st.session_state.last_saved_content = ""
-                        # else: delete_file_from_workspace shows errors
-                        del st.session_state.confirm_delete_pending
-                        st.rerun() # Update file list and editor view
-                with cancel_col:
-                    if st.button("Cancel Deletion", use_container_width=True, key="confirm_delete_no"):
-                        del st.session_state.confirm_delete_pending
-                        st.rerun()
-
-
-        else: # No file selected for editor
-            st.info("Select a Python file from the list on the left to view or edit its content.")
-            # Display a read-only placeholder in the editor area
-            st_ace(
-                value="# No file selected.\n\n# Please choose a file from the 'Project Files' list.",
-                language="python",
-                theme=ACE_DEFAULT_THEME,
-                keybinding=ACE_DEFAULT_KEYBINDING,
-                font_size=ACE_FONT_SIZE,
-                readonly=True,
-                height=500,
-                key="ace_editor_placeholder"
-            )
+        render_code_editor()
 
 # --- Live Preview Tab ---
 elif selected_tab == "Live Preview":
@@ -380,8 +431,7 @@ elif selected_tab == "Live Preview":
             # Attempt to show error output if available from the dead process
             if live_process:
                 try:
-                    stdout_output = live_process.stdout.read() if live_process.stdout else ""
-                    stderr_output = live_process.stderr.read() if live_process.stderr else ""
+                    stdout_output, stderr_output = read_preview_output(live_process)
                     if stdout_output or stderr_output:
                         with st.expander("Show Output from Stopped Preview Process", expanded=False):
                             if stdout_output: st.code(stdout_output, language=None, line_numbers=True)
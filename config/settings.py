@@ -2,24 +2,34 @@
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+import functools
+import string
+import logging
 from utils.logger import app_logger
-from google.generativeai.types import HarmCategory, HarmBlockThreshold # Import enums
 
 # --- Environment Variables ---
+def _load_env_file(dotenv_path: Path):
+    """
+    Loads variables from the given .env file into the environment, if the file exists.
+    The path is only resolved for the log message when that message will be emitted.
+    """
+    if os.path.isfile(dotenv_path):
+        load_dotenv(dotenv_path=dotenv_path)
+        if app_logger.isEnabledFor(logging.INFO):
+            app_logger.info(".env file found and loaded from %s", dotenv_path.resolve())
+    elif app_logger.isEnabledFor(logging.WARNING):
+        app_logger.warning(".env file NOT FOUND at %s. Relying on environment variables or Streamlit secrets.", dotenv_path.resolve())
+
 dotenv_path = Path('.') / '.env'
-if dotenv_path.exists():
-    load_dotenv(dotenv_path=dotenv_path)
-    app_logger.info(f".env file found and loaded from {dotenv_path.resolve()}")
-else:
-    app_logger.warning(f".env file NOT FOUND at {dotenv_path.resolve()}. Relying on environment variables or Streamlit secrets.")
+_load_env_file(dotenv_path)
 
 # --- API Keys ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 if GOOGLE_API_KEY and len(GOOGLE_API_KEY) > 10:
-    app_logger.info(f"GOOGLE_API_KEY loaded from environment. Length: {len(GOOGLE_API_KEY)}. Starts with: {GOOGLE_API_KEY[:4]}...")
+    app_logger.info("GOOGLE_API_KEY loaded from environment. Length: %d. Starts with: %s...", len(GOOGLE_API_KEY), GOOGLE_API_KEY[:4])
 elif GOOGLE_API_KEY:
-     app_logger.warning(f"GOOGLE_API_KEY loaded, but it's very short. Length: {len(GOOGLE_API_KEY)}. This might be an issue.")
+     app_logger.warning("GOOGLE_API_KEY loaded, but it's very short. Length: %d. This might be an issue.", len(GOOGLE_API_KEY))
 else:
     app_logger.error("GOOGLE_API_KEY is NOT FOUND in environment variables or .env file. AI features will fail.")
 
@@ -27,11 +37,13 @@ else:
 # --- Workspace Configuration ---
 WORKSPACE_DIR_NAME = "workspace_st_apps"
 WORKSPACE_DIR = Path(WORKSPACE_DIR_NAME)
+WORKSPACE_DIR_STR = os.path.abspath(WORKSPACE_DIR_NAME) # Plain-string form for the per-file hot paths
 try:
-    WORKSPACE_DIR.mkdir(parents=True, exist_ok=True)
-    app_logger.info(f"Workspace directory '{WORKSPACE_DIR.resolve()}' ensured.")
-except Exception as e:
-    app_logger.error(f"Could not create workspace directory '{WORKSPACE_DIR.resolve()}': {e}", exc_info=True)
+    os.makedirs(WORKSPACE_DIR_NAME, exist_ok=True)
+    if app_logger.isEnabledFor(logging.INFO):
+        app_logger.info("Workspace directory '%s' ensured.", WORKSPACE_DIR.resolve())
+except OSError as e:
+    app_logger.error("Could not create workspace directory '%s': %s", WORKSPACE_DIR.resolve(), e, exc_info=True)
 
 
 # --- Code Editor Appearance Settings (for streamlit-ace) ---
@@ -41,8 +53,13 @@ ACE_FONT_SIZE = 14
 ACE_TAB_SIZE = 4
 ACE_WRAP_LINES = True
 
+# --- Chat Sidebar Settings ---
+CHAT_HISTORY_WINDOW = 50 # Number of most recent chat messages rendered (more are loaded on demand)
+
 # --- AI Model Configuration ---
 GEMINI_MODEL_NAME = "gemini-1.5-pro-latest"
+# gRPC keeps one long-lived HTTP/2 channel per process, so requests after the first reuse the TLS connection.
+GEMINI_API_TRANSPORT = "grpc"
 
 # --- Gemini API Generation Configuration ---
 GEMINI_GENERATION_CONFIG = {
@@ -53,36 +70,38 @@ GEMINI_GENERATION_CONFIG = {
 }
 
 # --- Gemini API Safety Settings (Using Enums for robustness) ---
-GEMINI_SAFETY_SETTINGS = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-}
-app_logger.info(f"Gemini Safety Settings configured: { {category.name: threshold.name for category, threshold in GEMINI_SAFETY_SETTINGS.items()} }")
+@functools.cache
+def get_gemini_safety_settings() -> dict:
+    """
+    Returns the Gemini safety settings. The google.generativeai enums are imported on
+    first use so that loading this module doesn't pull in the Google SDK.
+    """
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold # Import enums
+
+    safety_settings = {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    }
+    if app_logger.isEnabledFor(logging.INFO):
+        app_logger.info("Gemini Safety Settings configured: %s", {category.name: threshold.name for category, threshold in safety_settings.items()})
+    return safety_settings
+
+# --- Gemini Response Cache ---
+GEMINI_RESPONSE_CACHE_SIZE = 256            # Max number of cached AI responses kept in memory (0 disables caching)
+GEMINI_MAX_RESPONSE_CHARS = 256_000         # AI responses longer than this are rejected without being parsed
 
 
 # --- System Prompt for Gemini AI ---
-# Note the use of {{ and }} for literal braces that are part of the JSON examples.
-# The {file_list} placeholder for .format() is correctly single-braced within the f-string context,
-# which means it needs to be {{file_list}} if this entire block was NOT an f-string itself but just a regular string.
-# Since it IS an f-string, {file_list} is fine if 'file_list' is a variable available at f-string definition.
-# However, we are using .format() later, so the placeholder for .format() should be single braces.
-# The f-string itself should escape literal braces.
-
-# To clarify:
-# 1. This string is defined as an f-string (starts with f""").
-# 2. Placeholders for .format() method (like {file_list}) should be single-braced.
-# 3. Literal curly braces that are part of the text (like in JSON examples) MUST be doubled ({{ or }})
-#    to distinguish them from f-string interpolation placeholders.
-
-GEMINI_SYSTEM_PROMPT_TEMPLATE = f"""
+# A string.Template: $file_list is the only placeholder, so the JSON examples' braces are written as-is.
+GEMINI_SYSTEM_PROMPT_TEMPLATE = """
 You are an AI assistant specialized in creating and managing Python files for Streamlit applications.
 Your primary goal is to accurately interpret user requests and translate them into file operations within a designated workspace.
 Respond *only* with a valid JSON array of command objects. Do not include any explanatory text, markdown formatting (like ```json), or any other content outside of this JSON array.
 
 Available commands:
-1.  `{{{{\"action\": \"create_update\", \"filename\": \"app_name.py\", \"content\": \"FULL_PYTHON_CODE_HERE\"}}}}`
+1.  `{\"action\": \"create_update\", \"filename\": \"app_name.py\", \"content\": \"FULL_PYTHON_CODE_HERE\"}`
     - Use this command to create a new Python file or completely overwrite an existing one.
     - The "filename" must be a valid Python file name (e.g., `my_app.py`).
     - The "content" must be the *complete and entire* Python code for the file.
@@ -92,28 +111,28 @@ Available commands:
         - Newlines must be represented as `\\n`.
     - Do *not* include ```python markdown blocks or shebangs (`#!/usr/bin/env python`) in the "content" field.
 
-2.  `{{{{\"action\": \"delete\", \"filename\": \"old_app.py\"}}}}`
+2.  `{\"action\": \"delete\", \"filename\": \"old_app.py\"}`
     - Use this command to delete a specified Python file from the workspace.
     - The "filename" must be the exact name of the file to be deleted.
 
-3.  `{{{{\"action\": \"chat\", \"content\": \"Your message here.\"}}}}`
+3.  `{\"action\": \"chat\", \"content\": \"Your message here.\"}`
     - Use this command *only* if:
         - You need to ask for clarification on an ambiguous user request.
         - You encounter an issue you cannot resolve with file actions (e.g., a conceptual problem with the request).
         - You need to confirm understanding before performing a significant or destructive action.
         - You want to provide a status update or a simple acknowledgement.
 
-Current Python files in workspace: {{file_list}}
+Current Python files in workspace: $file_list
 
 Example Interaction:
 User: Create a simple hello world app called hello.py
-AI: `[{{{{\"action\": \"create_update\", \"filename\": \"hello.py\", \"content\": \"import streamlit as st\\n\\nst.title('Hello World!')\\nst.write('This is a simple app.')\"}}}}]`
+AI: `[{\"action\": \"create_update\", \"filename\": \"hello.py\", \"content\": \"import streamlit as st\\n\\nst.title('Hello World!')\\nst.write('This is a simple app.')\"}]`
 
 User: Delete the app named old_app.py
-AI: `[{{{{\"action\": \"delete\", \"filename\": \"old_app.py\"}}}}]`
+AI: `[{\"action\": \"delete\", \"filename\": \"old_app.py\"}]`
 
 User: I'm not sure what to do next.
-AI: `[{{{{\"action\": \"chat\", \"content\": \"I can help you create or modify Streamlit apps. What would you like to build today?\"}}}}]`
+AI: `[{\"action\": \"chat\", \"content\": \"I can help you create or modify Streamlit apps. What would you like to build today?\"}]`
 
 Important Rules:
 - Your entire response *must* be a single JSON array `[...]`.
@@ -122,10 +141,26 @@ Important Rules:
 - Adhere strictly to the command formats specified.
 """
 
+_SYSTEM_PROMPT_TEMPLATE = string.Template(GEMINI_SYSTEM_PROMPT_TEMPLATE)
+if "file_list" not in _SYSTEM_PROMPT_TEMPLATE.get_identifiers(): # Validated once here instead of on every AI request
+    app_logger.error("Placeholder '$file_list' was NOT FOUND in GEMINI_SYSTEM_PROMPT_TEMPLATE. AI prompts will not include the workspace file list.")
+
+def build_system_prompt(file_list_str: str) -> str:
+    """
+    Returns the system prompt with the given workspace file list filled in.
+    """
+    return _SYSTEM_PROMPT_TEMPLATE.safe_substitute(file_list=file_list_str)
+
+# --- AI Command Execution ---
+AI_FILE_IO_MAX_WORKERS = 8 # Max threads used to write/delete files from one AI response concurrently
+
 # --- Preview Server Configuration ---
-PREVIEW_SERVER_STARTUP_TIMEOUT = 5
+PREVIEW_SERVER_STARTUP_TIMEOUT = 5 # Max seconds to wait for a preview server to accept connections
+PREVIEW_READINESS_POLL_INTERVAL = 0.05 # Seconds between preview readiness checks
 PREVIEW_PROCESS_TERMINATE_TIMEOUT = 3
 PREVIEW_PROCESS_KILL_TIMEOUT = 2
+PREVIEW_OUTPUT_READ_TIMEOUT = 1 # Max seconds to wait for a stopped preview's remaining output
+PREVIEW_OUTPUT_TAIL_LINES = 200 # Lines of preview stdout/stderr kept in memory for diagnostics
 
 app_logger.info("Configuration settings module processed.")
 
@@ -1,155 +1,380 @@
 # services/gemini_service.py
 import streamlit as st
-import google.generativeai as genai
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import json
+import functools
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+try: # orjson is a much faster drop-in for the hot (de)serialization paths
+    import orjson
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+    _json_loads = orjson.loads # orjson.JSONDecodeError subclasses json.JSONDecodeError
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
 from utils.logger import app_logger
 from utils.file_utils import save_file, delete_file_from_workspace
 from config.settings import (
-    GOOGLE_API_KEY, GEMINI_MODEL_NAME, WORKSPACE_DIR,
-    GEMINI_SYSTEM_PROMPT_TEMPLATE, GEMINI_GENERATION_CONFIG, GEMINI_SAFETY_SETTINGS
+    GOOGLE_API_KEY, GEMINI_MODEL_NAME, GEMINI_API_TRANSPORT, WORKSPACE_DIR_STR,
+    GEMINI_GENERATION_CONFIG, get_gemini_safety_settings,
+    GEMINI_RESPONSE_CACHE_SIZE, build_system_prompt,
+    AI_FILE_IO_MAX_WORKERS, GEMINI_MAX_RESPONSE_CHARS
 )
 
-# --- Module-level AI Model Client ---
-_gemini_model_client = None
+# --- AI Model Client (one per process, cached as a Streamlit resource) ---
+@st.cache_resource(show_spinner=False)
+def _create_gemini_model():
+    """
+    Configures the Google AI SDK and builds the Gemini model client.
+    Exceptions propagate, so Streamlit does not cache a failed initialization.
+    """
+    import google.generativeai as genai # Imported on first use; the SDK is slow to load
+    genai.configure(api_key=GOOGLE_API_KEY, transport=GEMINI_API_TRANSPORT)
+    app_logger.info("genai.configure called successfully.")
+    model = genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        generation_config=GEMINI_GENERATION_CONFIG,
+        safety_settings=get_gemini_safety_settings()
+    )
+    app_logger.info("Gemini client initialized successfully with model: %s", GEMINI_MODEL_NAME)
+    return model
 
 def _initialize_gemini_client():
     """
-    Initializes and returns the Gemini AI model client.
-    Uses a module-level global to avoid re-initialization on every call.
+    Returns the Gemini AI model client, or None if it cannot be initialized.
+    The client itself is cached by `_create_gemini_model`.
     """
-    global _gemini_model_client
-    if _gemini_model_client is None:
-        app_logger.info("Attempting to initialize Gemini client...")
-        if not GOOGLE_API_KEY:
-            err_msg = "🔴 Google API Key not configured (GOOGLE_API_KEY is missing or empty in config). Please set `GOOGLE_API_KEY` in `.env` or Streamlit secrets."
-            # This error is now primarily shown in app.py's sidebar status.
-            # st.error(err_msg) # Avoid direct st.error here if possible, let app.py handle UI
-            app_logger.critical(err_msg)
-            return None
+    if not GOOGLE_API_KEY:
+        err_msg = "🔴 Google API Key not configured (GOOGLE_API_KEY is missing or empty in config). Please set `GOOGLE_API_KEY` in `.env` or Streamlit secrets."
+        # This error is now primarily shown in app.py's sidebar status.
+        # st.error(err_msg) # Avoid direct st.error here if possible, let app.py handle UI
+        app_logger.critical(err_msg)
+        return None
 
-        app_logger.info(f"Found GOOGLE_API_KEY (length: {len(GOOGLE_API_KEY)}). Proceeding with Gemini client configuration.")
+    try:
+        return _create_gemini_model()
+    except Exception as e:
+        # This error is critical and should be visible.
+        err_msg_ui = f"🔴 Failed to initialize Google AI client: {type(e).__name__} - {str(e)[:100]}..."
+        st.error(err_msg_ui) # Show error in UI as this is a startup/config issue
+        app_logger.critical(f"Failed to initialize Google AI client during genai.configure or GenerativeModel instantiation: {e}", exc_info=True)
+        return None
 
-        try:
-            genai.configure(api_key=GOOGLE_API_KEY)
-            app_logger.info(f"genai.configure called successfully.")
-            _gemini_model_client = genai.GenerativeModel(
-                model_name=GEMINI_MODEL_NAME,
-                generation_config=GEMINI_GENERATION_CONFIG,
-                safety_settings=GEMINI_SAFETY_SETTINGS
-            )
-            app_logger.info(f"Gemini client initialized successfully with model: {GEMINI_MODEL_NAME}")
-        except Exception as e:
-            # This error is critical and should be visible.
-            err_msg_ui = f"🔴 Failed to initialize Google AI client: {type(e).__name__} - {str(e)[:100]}..."
-            st.error(err_msg_ui) # Show error in UI as this is a startup/config issue
-            app_logger.critical(f"Failed to initialize Google AI client during genai.configure or GenerativeModel instantiation: {e}", exc_info=True)
-            _gemini_model_client = None
-    return _gemini_model_client
+# --- Module-level AI Response Cache (LRU, shared by all sessions in this process) ---
+_response_cache: OrderedDict[str, str] = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _response_cache_key(chat_history: list, system_prompt: str) -> str:
+    """
+    Builds a cache key from the whole chat history and the system prompt
+    (which embeds the workspace file list), i.e. everything the model is sent.
+    """
+    # Hashes each message's memoized Gemini text, so only new messages are serialized per request
+    key_hash = hashlib.sha256(system_prompt.encode("utf-8"))
+    for msg in chat_history:
+        key_hash.update(b"\0" + msg["role"].encode("utf-8") + b"\0" + _gemini_text_for_message(msg).encode("utf-8"))
+    return key_hash.hexdigest()
+
+def _get_cached_response(cache_key: str) -> str | None:
+    """
+    Returns the cached AI response for the key (marking it as recently used), or None.
+    """
+    with _response_cache_lock:
+        cached_text = _response_cache.get(cache_key)
+        if cached_text is not None:
+            _response_cache.move_to_end(cache_key)
+        return cached_text
+
+def _store_cached_response(cache_key: str, response_text: str):
+    """
+    Stores a successful AI response, evicting the least recently used entries if needed.
+    Responses that don't parse into a command list are not cached, so a retry asks the model again.
+    """
+    if GEMINI_RESPONSE_CACHE_SIZE <= 0 or not _is_command_list(response_text):
+        return
+    with _response_cache_lock:
+        _response_cache[cache_key] = response_text
+        _response_cache.move_to_end(cache_key)
+        while len(_response_cache) > GEMINI_RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+# Matches a whole response wrapped in ``` or ```json fences and captures the inner text
+_CODE_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*\Z', re.DOTALL)
 
 def _clean_ai_response_text(ai_response_text: str) -> str:
     """
     Removes potential markdown code fences (e.g., ```json ... ```) from AI response.
     """
-    text = ai_response_text.strip()
-    if text.startswith("```json") and text.endswith("```"):
-        text = text[7:-3].strip()
-    elif text.startswith("```") and text.endswith("```"):
-        text = text[3:-3].strip()
-    return text
+    fence_match = _CODE_FENCE_RE.match(ai_response_text)
+    return fence_match.group(1) if fence_match else ai_response_text.strip()
+
+def _is_command_list(ai_response_text: str) -> bool:
+    """
+    Returns True if the AI response parses into a JSON list (the shape parse_and_execute_ai_commands accepts).
+    """
+    cleaned_text = _clean_ai_response_text(ai_response_text)
+    if len(cleaned_text) > GEMINI_MAX_RESPONSE_CHARS or not cleaned_text.startswith("["):
+        return False
+    try:
+        return isinstance(_json_loads(cleaned_text), list)
+    except json.JSONDecodeError:
+        return False
+
+# (compiled marker regex, user-facing message) pairs for classifying Gemini API errors.
+# Tried in order, so an API-key/permission error wins over a quota marker in the same text.
+_API_ERROR_PATTERNS = tuple(
+    (re.compile("|".join(map(re.escape, markers)), re.IGNORECASE), message)
+    for markers, message in (
+        (("api key not valid", "permission_denied"), "AI Error: Invalid or missing Google API Key, or key lacks permissions for the model. Please verify your key and its configuration in Google AI Studio / Google Cloud."),
+        (("429", "quota", "resource has been exhausted"), "AI Error: API Quota or Rate Limit Exceeded. Please try again later or check your Google Cloud project quotas."),
+    )
+)
+
+# Plain workspace filenames only: no path separators, '.py' extension, bounded length.
+_SAFE_FILENAME_RE = re.compile(r'\A[A-Za-z0-9_\-.]{1,128}\.py\Z')
+
+# Constant model turn acknowledging the system prompt, sent at the start of every conversation
+_PRIMING_MODEL_TURN = {
+    "role": "model",
+    "parts": [{"text": json.dumps([{"action": "chat", "content": "Understood. I will respond only with JSON commands as instructed."}])}]
+}
+
+@functools.lru_cache(maxsize=32)
+def _system_prompt_for_files(workspace_files: tuple[str, ...]) -> str:
+    """
+    Returns the system prompt for the given (sorted) workspace file names.
+    Cached, since the file list only changes when files are created or deleted.
+    """
+    file_list_str = ', '.join(workspace_files) if workspace_files else 'None'
+    return build_system_prompt(file_list_str)
+
+def _serialize_message_content(role: str, content) -> str:
+    """
+    Returns the text sent to Gemini for a chat message's content.
+    Assistant command lists are sent back as JSON; anything else as plain text.
+    """
+    if isinstance(content, str): # Fast path: user prompts and plain AI chat
+        return content
+    if role == "assistant" and isinstance(content, list):
+        try:
+            return _json_dumps(content)
+        except TypeError as e:
+            app_logger.error(f"Error serializing assistant message to JSON: {content}. Error: {e}")
+    return str(content)
+
+@functools.lru_cache(maxsize=32)
+def _priming_prefix(system_prompt: str) -> tuple[dict, dict]:
+    """
+    Returns the (system prompt, model acknowledgement) turns that open every Gemini history.
+    Cached per prompt; the system prompt string only changes when the workspace files do.
+    """
+    return ({"role": "user", "parts": [{"text": system_prompt}]}, _PRIMING_MODEL_TURN)
+
+def _gemini_text_for_message(msg: dict) -> str:
+    """
+    Returns the serialized Gemini text for a chat message.
+    Memoized on the message dict itself ("_gemini_text"), since stored chat messages never change.
+    """
+    content_str = msg.get("_gemini_text")
+    if content_str is None:
+        content_str = msg["_gemini_text"] = _serialize_message_content(msg["role"], msg["content"])
+    return content_str
 
 def _prepare_gemini_history(chat_history: list, system_prompt: str) -> list:
     """
     Formats chat history for the Gemini API call, including the system prompt.
     """
-    gemini_history = []
-    gemini_history.append({"role": "user", "parts": [{"text": system_prompt}]})
-    gemini_history.append({"role": "model", "parts": [{"text": json.dumps([{"action": "chat", "content": "Understood. I will respond only with JSON commands as instructed."}])}]})
-
-    for msg in chat_history:
-        role = msg["role"]
-        content = msg["content"]
-        api_role = "model" if role == "assistant" else "user"
-
-        if role == "assistant" and isinstance(content, list):
-            try:
-                content_str = json.dumps(content)
-            except TypeError as e:
-                app_logger.error(f"Error serializing assistant message to JSON: {content}. Error: {e}")
-                content_str = str(content)
-        else:
-            content_str = str(content)
-
-        if content_str:
-            gemini_history.append({"role": api_role, "parts": [{"text": content_str}]})
+    gemini_history = list(_priming_prefix(system_prompt))
+    serialized_messages = ((msg["role"], _gemini_text_for_message(msg)) for msg in chat_history)
+    gemini_history.extend(
+        {"role": "model" if role == "assistant" else "user", "parts": [{"text": content_str}]}
+        for role, content_str in serialized_messages
+        if content_str
+    )
     return gemini_history
 
-def ask_gemini_ai(chat_history: list, current_workspace_files: list[str]) -> str:
+def ask_gemini_ai(
+    chat_history: list,
+    current_workspace_files: tuple[str, ...],
+    on_chunk: Callable[[str], None] | None = None
+) -> str:
     """
     Sends the conversation history to the Gemini AI and returns its raw text response.
+
+    The response is streamed from the API. If `on_chunk` is given, it is called with the
+    text accumulated so far every time a new chunk arrives, so the UI can render partial
+    output instead of waiting for the complete response.
     """
+    system_prompt_with_context = _system_prompt_for_files(tuple(sorted(current_workspace_files)))
+
+    cache_key = _response_cache_key(chat_history, system_prompt_with_context)
+    cached_response_text = _get_cached_response(cache_key)
+    if cached_response_text is not None:
+        app_logger.info("Returning cached Gemini response (identical conversation and workspace files).")
+        return cached_response_text
+
     model = _initialize_gemini_client()
     if not model:
         app_logger.error("Gemini client not available for ask_gemini_ai call because _initialize_gemini_client failed.")
         return json.dumps([{"action": "chat", "content": "AI Error: Gemini client is not initialized. Please check API key and configuration (see logs for details)."}])
 
-    file_list_str = ', '.join(current_workspace_files) if current_workspace_files else 'None'
-    
-    # --- BEGIN DEBUG LOGGING for system prompt formatting ---
-    app_logger.debug(f"GEMINI_SYSTEM_PROMPT_TEMPLATE (first 300 chars): {GEMINI_SYSTEM_PROMPT_TEMPLATE[:300]}")
-    if "{file_list}" in GEMINI_SYSTEM_PROMPT_TEMPLATE:
-        app_logger.debug("Placeholder '{file_list}' was FOUND in GEMINI_SYSTEM_PROMPT_TEMPLATE string literal.")
-    else:
-        app_logger.error("Placeholder '{file_list}' was NOT FOUND in GEMINI_SYSTEM_PROMPT_TEMPLATE string literal. This will cause a KeyError if not intended.")
-    # --- END DEBUG LOGGING ---
-
-    try:
-        system_prompt_with_context = GEMINI_SYSTEM_PROMPT_TEMPLATE.format(file_list=file_list_str)
-    except KeyError as e:
-        # Log the specific key that caused the error
-        app_logger.error(f"KeyError formatting system prompt. Offending key: '{e}'. This means the placeholder '{{{e}}}' was found in the template but not provided as a keyword argument to .format(), OR '{e}' was expected but the placeholder was different (e.g. 'file_list' was expected but the placeholder was misspelled).", exc_info=True)
-        return json.dumps([{"action": "chat", "content": f"AI Error: System prompt configuration issue. Offending placeholder key: '{e}'. Please check server logs."}])
-    except Exception as e_format: # Catch any other formatting errors
-        app_logger.error(f"Unexpected error during system prompt formatting: {e_format}", exc_info=True)
-        return json.dumps([{"action": "chat", "content": "AI Error: Critical issue during system prompt formatting. Please check server logs."}])
-
-
     gemini_api_history = _prepare_gemini_history(chat_history, system_prompt_with_context)
-    app_logger.debug(f"Sending history to Gemini (length: {len(gemini_api_history)} entries). Last user message: {chat_history[-1]['content'] if chat_history and chat_history[-1]['role']=='user' else 'N/A'}")
+    if app_logger.isEnabledFor(logging.DEBUG):
+        last_user_message = chat_history[-1]['content'] if chat_history and chat_history[-1]['role'] == 'user' else 'N/A'
+        app_logger.debug("Sending history to Gemini (length: %d entries). Last user message: %s", len(gemini_api_history), last_user_message)
 
-    try:
-        response = model.generate_content(gemini_api_history)
-        if response.prompt_feedback and response.prompt_feedback.block_reason:
-            app_logger.warning(f"Gemini response was blocked. Reason: {response.prompt_feedback.block_reason}. Safety ratings: {response.prompt_feedback.safety_ratings}")
-        app_logger.debug(f"Received response from Gemini. Text length: {len(response.text) if response.text else 0}.")
-        return response.text
+    response = None
+    response_text = ""
+    try: # Only the API call and stream consumption; bookkeeping below can't be mistaken for an API failure
+        response = model.generate_content(gemini_api_history, stream=True)
+        for chunk in response:
+            response_text += chunk.text
+            if on_chunk:
+                on_chunk(response_text)
     except Exception as e:
-        error_message = f"Gemini API call to model.generate_content failed: {type(e).__name__} - {str(e)[:250]}"
+        error_text = str(e)
+        error_message = f"Gemini API call to model.generate_content failed: {type(e).__name__} - {error_text[:250]}"
         app_logger.error(error_message, exc_info=True)
 
-        error_content = f"AI Error: API call failed. Details: {str(e)[:150]}..."
-        # ... (rest of specific error handling for API call) ...
-        if "API key not valid" in str(e).lower() or "permission_denied" in str(e).lower() or "PERMISSION_DENIED" in str(e).upper():
-            error_content = "AI Error: Invalid or missing Google API Key, or key lacks permissions for the model. Please verify your key and its configuration in Google AI Studio / Google Cloud."
-        elif "429" in str(e) or "quota" in str(e).lower() or "resource has been exhausted" in str(e).lower():
-            error_content = "AI Error: API Quota or Rate Limit Exceeded. Please try again later or check your Google Cloud project quotas."
-        # ... (other specific error messages)
-        
+        error_content = next(
+            (message for marker_re, message in _API_ERROR_PATTERNS if marker_re.search(error_text)),
+            f"AI Error: API call failed. Details: {error_text[:150]}..."
+        )
+
         return json.dumps([{"action": "chat", "content": error_content}])
 
+    prompt_feedback = getattr(response, "prompt_feedback", None)
+    if prompt_feedback is not None and prompt_feedback.block_reason:
+        app_logger.warning(f"Gemini response was blocked. Reason: {prompt_feedback.block_reason}. Safety ratings: {prompt_feedback.safety_ratings}")
+    app_logger.debug("Received response from Gemini. Text length: %d.", len(response_text))
+    _store_cached_response(cache_key, response_text)
+    return response_text
+
+
+def _handle_create_update(command_data: dict) -> tuple[str, str, str] | None:
+    """
+    Validates a 'create_update' command.
+    Returns the file operation to run, or None after recording a failure status on the command.
+    """
+    filename = command_data.get("filename")
+    content = command_data.get("content")
+    if not filename or content is None:
+        warn_msg = "AI 'create_update' command missing filename or content."
+        st.warning(warn_msg)
+        app_logger.warning(warn_msg)
+        command_data['status'] = 'failed: missing parameters'
+        return None
+    if not _SAFE_FILENAME_RE.match(filename):
+        st.error(f"AI command failed: Filename '{filename}' must be a plain file name ending with '.py'.")
+        app_logger.error(f"AI 'create_update' for invalid filename: {filename}")
+        command_data['status'] = 'failed: invalid filename'
+        return None
+    return ("create_update", filename, content)
+
+def _handle_delete(command_data: dict) -> tuple[str, str, None] | None:
+    """
+    Validates a 'delete' command.
+    Returns the file operation to run, or None after recording a failure status on the command.
+    """
+    filename = command_data.get("filename")
+    if not filename:
+        warn_msg = "AI 'delete' command missing filename."
+        st.warning(warn_msg)
+        app_logger.warning(warn_msg)
+        command_data['status'] = 'failed: missing filename'
+        return None
+    return ("delete", filename, None)
+
+def _handle_chat(command_data: dict) -> None:
+    """Records a 'chat' command; it needs no file operation."""
+    app_logger.info("AI 'chat' action: %s", command_data.get('content'))
+    command_data['status'] = 'chat message'
+    return None
+
+def _handle_unknown_action(command_data: dict) -> None:
+    """Records a command whose action isn't recognised."""
+    action = command_data.get("action")
+    warn_msg = f"AI sent unknown action: '{action}'."
+    st.warning(warn_msg)
+    app_logger.warning(warn_msg)
+    command_data['status'] = f'failed: unknown action ({action})'
+    return None
+
+# AI command action -> handler that validates the command and returns its file operation (if any)
+_ACTION_HANDLERS = {
+    "create_update": _handle_create_update,
+    "delete": _handle_delete,
+    "chat": _handle_chat,
+}
+
+def _run_file_operations(file_operations: list[tuple[str, str, str | None]]) -> list[bool]:
+    """
+    Executes (action, filename, content) file operations and returns their success flags in order.
+
+    Operations on different files are independent and IO-bound, so they run on a thread pool.
+    All operations on the same file run in one worker, in their original order.
+    """
+    results = [False] * len(file_operations)
+    operation_indices_by_filename: dict[str, list[int]] = {}
+    for op_idx, (_, filename, _) in enumerate(file_operations):
+        operation_indices_by_filename.setdefault(filename, []).append(op_idx)
+
+    def run_operations_for_file(op_indices: list[int]):
+        for op_idx in op_indices:
+            action, filename, content = file_operations[op_idx]
+            if action == "create_update":
+                results[op_idx] = save_file(filename, content, WORKSPACE_DIR_STR)
+            else:
+                results[op_idx] = delete_file_from_workspace(filename, WORKSPACE_DIR_STR, show_toast=False)
+
+    if len(operation_indices_by_filename) <= 1: # Nothing to parallelize
+        for op_indices in operation_indices_by_filename.values():
+            run_operations_for_file(op_indices)
+        return results
+
+    # Worker threads need the script run context so file_utils can still call st.error/st.toast.
+    script_run_ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=min(AI_FILE_IO_MAX_WORKERS, len(operation_indices_by_filename)),
+        initializer=add_script_run_ctx,
+        initargs=(None, script_run_ctx)
+    ) as executor:
+        list(executor.map(run_operations_for_file, operation_indices_by_filename.values()))
+    return results
 
 def parse_and_execute_ai_commands(ai_response_text: str) -> list[dict]:
     # ... (rest of the function remains the same) ...
     cleaned_text = _clean_ai_response_text(ai_response_text)
     executed_commands_list = []
 
+    # Cheap shape checks before paying for a full parse of a response that can't be a command list
+    if len(cleaned_text) > GEMINI_MAX_RESPONSE_CHARS:
+        err_msg = f"AI response is too large to process ({len(cleaned_text)} characters, limit {GEMINI_MAX_RESPONSE_CHARS})."
+        st.error(err_msg)
+        app_logger.error(err_msg)
+        return [{"action": "chat", "content": "AI Error: Response was too large to process."}]
+    if not cleaned_text.startswith("["): # cleaned_text is already stripped
+        err_msg = f"AI response is not a JSON list of commands. Received: {cleaned_text}"
+        st.error(err_msg)
+        app_logger.error(err_msg)
+        # Keep the model's text: the st.error above is cleared by the rerun, the chat entry is not
+        return [{"action": "chat", "content": f"AI Error: Response was not a list of commands. Response: {ai_response_text}"}]
+
     try:
-        commands = json.loads(cleaned_text)
+        commands = _json_loads(cleaned_text)
         if not isinstance(commands, list):
             err_msg = f"AI response was valid JSON, but not a list of commands. Received: {cleaned_text}"
             st.error(err_msg)
             app_logger.error(err_msg)
             return [{"action": "chat", "content": "AI Error: Response was not a list of commands."}]
 
+        pending_file_operations = [] # (index in executed_commands_list, action, filename, content)
         for command_data in commands:
             if not isinstance(command_data, dict):
                 warn_msg = f"AI sent an invalid command format (not a dict): {command_data}"
@@ -158,73 +383,63 @@ def parse_and_execute_ai_commands(ai_response_text: str) -> list[dict]:
                 executed_commands_list.append({"action": "chat", "content": f"AI Warning: Invalid command format: {command_data}"})
                 continue
 
-            app_logger.info(f"Processing AI command: {command_data}")
-            executed_commands_list.append(command_data.copy())
+            app_logger.info("Processing AI command: %s", command_data)
+            executed_commands_list.append(command_data) # Freshly parsed, safe to annotate in place
 
             action = command_data.get("action")
-            filename = command_data.get("filename")
-            content = command_data.get("content")
+            handler = _ACTION_HANDLERS.get(action, _handle_unknown_action) if isinstance(action, str) else _handle_unknown_action
+            file_operation = handler(command_data)
+            if file_operation is not None:
+                pending_file_operations.append((len(executed_commands_list) - 1, *file_operation))
 
+        # Execute the file writes/deletes (concurrently where possible), then record the
+        # outcomes and update the editor state in the original command order.
+        file_operation_results = _run_file_operations(
+            [(action, filename, content) for _, action, filename, content in pending_file_operations]
+        )
+        selected_file = st.session_state.get("selected_file")
+        pending_state_updates = {} # Applied to session state once, after all commands are processed
+        saved_filenames, deleted_filenames = [], [] # Reported in one toast per kind, not one per file
+        for (entry_idx, action, filename, content), success in zip(pending_file_operations, file_operation_results):
             if action == "create_update":
-                if filename and content is not None:
-                    if not filename.endswith(".py"):
-                        st.error(f"AI command failed: Filename '{filename}' must end with '.py'.")
-                        app_logger.error(f"AI 'create_update' for invalid filename: {filename}")
-                        executed_commands_list[-1]['status'] = 'failed: invalid filename'
-                        continue
-
-                    success = save_file(filename, content, WORKSPACE_DIR)
-                    if success:
-                        st.toast(f"AI created/updated: {filename}", icon="💾")
-                        app_logger.info(f"AI 'create_update' successful for '{filename}'.")
-                        if st.session_state.selected_file == filename:
-                            st.session_state.file_content_on_load = content
-                            st.session_state.editor_unsaved_content = content
-                            st.session_state.last_saved_content = content
-                            app_logger.debug(f"Updated session state for active editor file '{filename}' after AI save.")
-                        executed_commands_list[-1]['status'] = 'success'
-                    else:
-                        app_logger.error(f"AI 'create_update' failed for '{filename}'.")
-                        executed_commands_list[-1]['status'] = 'failed: save error'
+                if success:
+                    saved_filenames.append(filename)
+                    app_logger.info("AI 'create_update' successful for '%s'.", filename)
+                    if selected_file == filename:
+                        pending_state_updates.update(
+                            file_content_on_load=content,
+                            editor_unsaved_content=content,
+                            last_saved_content=content,
+                        )
+                        app_logger.debug("Updated session state for active editor file '%s' after AI save.", filename)
+                    executed_commands_list[entry_idx]['status'] = 'success'
                 else:
-                    warn_msg = "AI 'create_update' command missing filename or content."
-                    st.warning(warn_msg)
-                    app_logger.warning(warn_msg)
-                    executed_commands_list[-1]['status'] = 'failed: missing parameters'
-
-
-            elif action == "delete":
-                if filename:
-                    success = delete_file_from_workspace(filename, WORKSPACE_DIR)
-                    if success:
-                        app_logger.info(f"AI 'delete' successful for '{filename}'.")
-                        if st.session_state.selected_file == filename:
-                            st.session_state.selected_file = None
-                            st.session_state.file_content_on_load = ""
-                            st.session_state.editor_unsaved_content = ""
-                            st.session_state.last_saved_content = ""
-                            app_logger.debug(f"Cleared session state for active editor file '{filename}' after AI delete.")
-                        executed_commands_list[-1]['status'] = 'success'
-                    else:
-                        app_logger.error(f"AI 'delete' failed for '{filename}'.")
-                        executed_commands_list[-1]['status'] = 'failed: delete error'
+                    app_logger.error(f"AI 'create_update' failed for '{filename}'.")
+                    executed_commands_list[entry_idx]['status'] = 'failed: save error'
+            else: # delete
+                if success:
+                    app_logger.info("AI 'delete' successful for '%s'.", filename)
+                    deleted_filenames.append(filename)
+                    if selected_file == filename:
+                        selected_file = None
+                        pending_state_updates.update(
+                            selected_file=None,
+                            file_content_on_load="",
+                            editor_unsaved_content="",
+                            last_saved_content="",
+                        )
+                        app_logger.debug("Cleared session state for active editor file '%s' after AI delete.", filename)
+                    executed_commands_list[entry_idx]['status'] = 'success'
                 else:
-                    warn_msg = "AI 'delete' command missing filename."
-                    st.warning(warn_msg)
-                    app_logger.warning(warn_msg)
-                    executed_commands_list[-1]['status'] = 'failed: missing filename'
-
-            elif action == "chat":
-                app_logger.info(f"AI 'chat' action: {command_data.get('content')}")
-                executed_commands_list[-1]['status'] = 'chat message'
-                pass
-
-            else:
-                warn_msg = f"AI sent unknown action: '{action}'."
-                st.warning(warn_msg)
-                app_logger.warning(warn_msg)
-                executed_commands_list[-1]['status'] = f'failed: unknown action ({action})'
+                    app_logger.error(f"AI 'delete' failed for '{filename}'.")
+                    executed_commands_list[entry_idx]['status'] = 'failed: delete error'
 
+        if saved_filenames:
+            st.toast(f"AI created/updated: {', '.join(saved_filenames)}", icon="💾")
+        if deleted_filenames:
+            st.toast(f"AI deleted: {', '.join(deleted_filenames)}", icon="🗑️")
+        if pending_state_updates:
+            st.session_state.update(pending_state_updates)
         return executed_commands_list
 
     except json.JSONDecodeError:
@@ -3,37 +3,142 @@ import streamlit as st
 import subprocess
 import socket
 import sys
+import threading
 import time
+import weakref
+from collections import deque
 from pathlib import Path
 from utils.logger import app_logger
 from config.settings import (
     WORKSPACE_DIR, PREVIEW_SERVER_STARTUP_TIMEOUT,
-    PREVIEW_PROCESS_TERMINATE_TIMEOUT, PREVIEW_PROCESS_KILL_TIMEOUT
+    PREVIEW_PROCESS_TERMINATE_TIMEOUT, PREVIEW_PROCESS_KILL_TIMEOUT, PREVIEW_OUTPUT_READ_TIMEOUT, PREVIEW_READINESS_POLL_INTERVAL,
+    PREVIEW_OUTPUT_TAIL_LINES
 )
 
-def _find_available_port(start_port: int = 8502, max_attempts: int = 100) -> int | None:
+# Fixed parts of the preview command line; only the script path and port vary per launch
+_PREVIEW_RUN_ARGS = ("-m", "streamlit", "run")
+_PREVIEW_SERVER_OPTIONS = (
+    "--server.headless", "true",    # Don't open a browser automatically
+    "--server.runOnSave", "false",  # Don't automatically rerun on save from its own watcher
+    "--server.fileWatcherType", "none", # Disable Streamlit's internal file watcher
+    "--client.toolbarMode", "minimal", # Keep preview toolbar minimal
+)
+
+def _find_available_port() -> int | None:
+    """
+    Finds an unused network port by letting the OS assign a free ephemeral port.
+
+    Returns:
+        int | None: An available port number, or None if no port could be obtained.
+    """
+    # The Streamlit child listens on both IPv4 and IPv6, so probe both families at once where the
+    # platform supports a dual-stack socket; a port in use on either one is then never picked.
+    if socket.has_dualstack_ipv6():
+        family, bind_address = socket.AF_INET6, ('::', 0)
+    else:
+        family, bind_address = socket.AF_INET, ('', 0)
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as s:
+            # Bind with the same rules the preview server uses (Streamlit sets SO_REUSEADDR), so
+            # the probe agrees with the child about ports still in TIME_WAIT. On Windows
+            # SO_REUSEADDR allows port stealing and can't be combined with SO_EXCLUSIVEADDRUSE.
+            if sys.platform == "win32":
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+            else:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if family == socket.AF_INET6:
+                s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+            s.bind(bind_address) # Port 0: the kernel picks a free port in one call
+            port = s.getsockname()[1]
+    except OSError as e:
+        app_logger.error(f"Could not obtain an available port from the OS: {e}")
+        return None
+    app_logger.info(f"Found available port: {port}")
+    return port
+
+
+def _wait_for_preview_server(process: subprocess.Popen, port: int, timeout: float) -> bool:
+    """
+    Waits until the preview server accepts TCP connections on `port`, the process exits,
+    or `timeout` seconds pass, whichever comes first.
+
+    Returns:
+        bool: True if the server accepted a connection, False otherwise.
     """
-    Finds an unused network port, starting from start_port.
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None: # Exited during startup; the caller reports the failure
+            return False
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(PREVIEW_READINESS_POLL_INTERVAL)
+    return False
+
+
+# Preview process -> (stdout tail, stderr tail, drainer threads). Weak keys, so entries
+# disappear with the Popen object even if stop_preview is never called for it.
+_preview_output_tails = weakref.WeakKeyDictionary()
+
+
+def _drain_pipe(pipe, tail: deque):
+    """Reads a process pipe line by line until EOF, keeping only the most recent lines."""
+    try:
+        for line in pipe:
+            tail.append(line)
+    except (OSError, ValueError): # Pipe closed underneath us
+        pass
+    finally:
+        pipe.close()
+
+
+def _start_output_drainers(process: subprocess.Popen):
+    """
+    Continuously drains the preview process's stdout/stderr on background threads.
+
+    Without a reader, a long-running preview eventually fills the OS pipe buffer (~64KB on
+    Linux) and blocks on its next write. The last PREVIEW_OUTPUT_TAIL_LINES lines of each
+    stream are kept for `read_preview_output`.
+    """
+    stdout_tail = deque(maxlen=PREVIEW_OUTPUT_TAIL_LINES)
+    stderr_tail = deque(maxlen=PREVIEW_OUTPUT_TAIL_LINES)
+    threads = tuple(
+        threading.Thread(target=_drain_pipe, args=(pipe, tail), name=f"preview-{process.pid}-{stream}", daemon=True)
+        for pipe, tail, stream in ((process.stdout, stdout_tail, "stdout"), (process.stderr, stderr_tail, "stderr"))
+        if pipe is not None
+    )
+    for thread in threads:
+        thread.start()
+    _preview_output_tails[process] = (stdout_tail, stderr_tail, threads)
+
+
+def read_preview_output(process: subprocess.Popen) -> tuple[str, str]:
+    """
+    Collects the captured stdout/stderr of a preview process without blocking indefinitely.
+
+    For processes started by `start_preview`, this is the tail kept by the drainer threads
+    (waiting briefly for them to reach EOF). Otherwise `communicate()` with a timeout is used,
+    since a plain `.read()` blocks forever if a child of the preview still holds the pipes open.
 
     Args:
-        start_port (int): The port number to start checking from.
-        max_attempts (int): Maximum number of ports to check.
+        process (subprocess.Popen): The (usually already exited) preview process.
 
     Returns:
-        int | None: An available port number, or None if no port is found.
+        tuple[str, str]: The captured stdout and stderr text (empty strings if unavailable).
     """
-    for i in range(max_attempts):
-        port = start_port + i
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('', port)) # Try to bind to the port
-                app_logger.info(f"Found available port: {port}")
-                return s.getsockname()[1]
-        except OSError: # Port is likely in use
-            app_logger.debug(f"Port {port} is in use, trying next.")
-            continue
-    app_logger.error(f"Could not find an available port after {max_attempts} attempts starting from {start_port}.")
-    return None
+    drained = _preview_output_tails.get(process)
+    if drained is not None:
+        stdout_tail, stderr_tail, threads = drained
+        for thread in threads:
+            thread.join(timeout=PREVIEW_OUTPUT_READ_TIMEOUT)
+        return "".join(list(stdout_tail)), "".join(list(stderr_tail))
+
+    try:
+        stdout_output, stderr_output = process.communicate(timeout=PREVIEW_OUTPUT_READ_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        app_logger.warning(f"Timed out after {PREVIEW_OUTPUT_READ_TIMEOUT}s reading output from preview process (PID: {process.pid}).")
+        return "", ""
+    return stdout_output or "", stderr_output or ""
 
 
 def stop_preview():
@@ -48,21 +153,21 @@ def stop_preview():
     if process_to_stop and pid:
         app_logger.info(f"Attempting to stop preview process (PID: {pid}) for file '{preview_file}'.")
         try:
-            if process_to_stop.poll() is None: # Process is still running
+            return_code = process_to_stop.poll()
+            if return_code is None: # Process is still running
                 process_to_stop.terminate() # Ask politely first
                 try:
                     process_to_stop.wait(timeout=PREVIEW_PROCESS_TERMINATE_TIMEOUT)
                     st.toast(f"Preview for '{preview_file}' (PID: {pid}) stopped.", icon="⏹️")
                     app_logger.info(f"Preview process {pid} for '{preview_file}' terminated gracefully.")
-                except subprocess.TimeoutExpired:
+                except subprocess.TimeoutExpired: # wait() timing out means it is still alive
                     app_logger.warning(f"Preview process {pid} for '{preview_file}' did not terminate gracefully, killing...")
-                    if process_to_stop.poll() is None: # Check again before kill
-                        process_to_stop.kill()
-                        process_to_stop.wait(timeout=PREVIEW_PROCESS_KILL_TIMEOUT) # Brief wait for kill
-                        st.toast(f"Preview for '{preview_file}' (PID: {pid}) forcefully killed.", icon="💀")
-                        app_logger.info(f"Preview process {pid} for '{preview_file}' killed.")
+                    process_to_stop.kill()
+                    process_to_stop.wait(timeout=PREVIEW_PROCESS_KILL_TIMEOUT) # Brief wait for kill
+                    st.toast(f"Preview for '{preview_file}' (PID: {pid}) forcefully killed.", icon="💀")
+                    app_logger.info(f"Preview process {pid} for '{preview_file}' killed.")
             else:
-                app_logger.warning(f"Preview process {pid} for '{preview_file}' had already stopped (poll result: {process_to_stop.poll()}).")
+                app_logger.warning(f"Preview process {pid} for '{preview_file}' had already stopped (poll result: {return_code}).")
         except ProcessLookupError: # Process already gone
             app_logger.warning(f"Preview process {pid} for '{preview_file}' not found (already gone?).")
         except Exception as e:
@@ -74,6 +179,9 @@ def stop_preview():
         app_logger.info("No active preview process found to stop.")
 
 
+    if process_to_stop:
+        _preview_output_tails.pop(process_to_stop, None) # Drainer threads exit on their own at EOF
+
     # Always clear the preview state variables after attempting to stop
     st.session_state.preview_process = None
     st.session_state.preview_port = None
@@ -93,8 +201,8 @@ def start_preview(python_filename: str) -> bool:
     Returns:
         bool: True if the preview started successfully, False otherwise.
     """
-    filepath = WORKSPACE_DIR / python_filename
-    if not filepath.is_file() or filepath.suffix != '.py':
+    filepath = (WORKSPACE_DIR / python_filename).resolve() # Resolved once; reused for the command line
+    if filepath.suffix != '.py' or not filepath.is_file():
         st.error(f"Cannot preview: '{python_filename}' is not a valid Python file or does not exist.")
         app_logger.error(f"Preview attempt for invalid file: {filepath}")
         return False
@@ -119,13 +227,10 @@ def start_preview(python_filename: str) -> bool:
             # Command to run: python -m streamlit run <filepath> --server.port <port> [options]
             command = [
                 sys.executable, # Use the same Python interpreter running this script
-                "-m", "streamlit", "run",
-                str(filepath.resolve()), # Absolute path to the file
+                *_PREVIEW_RUN_ARGS,
+                str(filepath), # Absolute path to the file
                 "--server.port", str(port),
-                "--server.headless", "true",    # Don't open a browser automatically
-                "--server.runOnSave", "false",  # Don't automatically rerun on save from its own watcher
-                "--server.fileWatcherType", "none", # Disable Streamlit's internal file watcher
-                "--client.toolbarMode", "minimal" # Keep preview toolbar minimal
+                *_PREVIEW_SERVER_OPTIONS,
             ]
             app_logger.info(f"Starting preview with command: {' '.join(command)}")
 
@@ -140,9 +245,11 @@ def start_preview(python_filename: str) -> bool:
                 encoding='utf-8',
                 # creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0 # Optional: hide console on Windows
             )
+            _start_output_drainers(preview_proc) # Keep the pipes from filling up while the preview runs
 
-            # Give Streamlit a moment to start up or fail
-            time.sleep(PREVIEW_SERVER_STARTUP_TIMEOUT)
+            # Wait until Streamlit is serving (or has failed) rather than sleeping the full timeout
+            if not _wait_for_preview_server(preview_proc, port, PREVIEW_SERVER_STARTUP_TIMEOUT) and preview_proc.poll() is None:
+                app_logger.warning(f"Preview server for '{python_filename}' did not accept connections within {PREVIEW_SERVER_STARTUP_TIMEOUT}s; assuming it is still starting.")
 
             # Check if the process started successfully (is still running)
             if preview_proc.poll() is None: # poll() returns None if process is running
@@ -161,8 +268,7 @@ def start_preview(python_filename: str) -> bool:
                 app_logger.error(f"Preview process for '{python_filename}' failed to start or exited prematurely (code: {preview_proc.poll()}).")
                 try:
                     # Capture and display stderr/stdout from the failed process
-                    stdout_output = preview_proc.stdout.read() if preview_proc.stdout else ""
-                    stderr_output = preview_proc.stderr.read() if preview_proc.stderr else ""
+                    stdout_output, stderr_output = read_preview_output(preview_proc)
                     if stdout_output:
                         app_logger.error(f"Preview STDOUT for '{python_filename}':\n{stdout_output}")
                         with st.expander("Show Preview Process Output (stdout)", expanded=False):
@@ -177,6 +283,7 @@ def start_preview(python_filename: str) -> bool:
                     st.error(f"Could not read output from failed preview process: {read_e}")
                     app_logger.error(f"Error reading output from failed preview process for '{python_filename}': {read_e}", exc_info=True)
                 # Clear any partial state
+                _preview_output_tails.pop(preview_proc, None)
                 st.session_state.preview_process = None
                 return False
         except Exception as e:
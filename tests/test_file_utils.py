@@ -1,106 +1,151 @@
 # tests/test_file_utils.py
-import unittest
-from pathlib import Path
-import shutil
+# Install the test dependencies with: `pip install -r requirements-dev.txt`
+# Run from the project root with: `python -m pytest tests`
 import os
 
-# Adjust import path based on how you run tests (e.g., from project root)
-# If running `python -m unittest discover tests` from project root:
-from utils.file_utils import save_file, read_file, get_workspace_python_files, delete_file_from_workspace
-from config.settings import WORKSPACE_DIR # Using the actual workspace for some tests can be tricky, consider a dedicated test workspace
-
-# It's often better to use a temporary directory for file operation tests
-TEST_WORKSPACE_NAME = "test_temp_workspace_fu"
-
-class TestFileUtils(unittest.TestCase):
-
-    @classmethod
-    def setUpClass(cls):
-        """Create a temporary workspace for tests."""
-        cls.test_workspace = Path(TEST_WORKSPACE_NAME)
-        if cls.test_workspace.exists():
-            shutil.rmtree(cls.test_workspace) # Clean up if exists from previous failed run
-        cls.test_workspace.mkdir(parents=True, exist_ok=True)
-
-    @classmethod
-    def tearDownClass(cls):
-        """Remove the temporary workspace after all tests."""
-        if cls.test_workspace.exists():
-            shutil.rmtree(cls.test_workspace)
-
-    def setUp(self):
-        """Clean the test workspace before each test method."""
-        for item in self.test_workspace.iterdir():
-            if item.is_file():
-                os.remove(item)
-            elif item.is_dir():
-                shutil.rmtree(item)
-
-    def test_01_save_and_read_file(self):
-        """Test saving a file and then reading it."""
-        filename = "test_app_01.py"
-        content = "import streamlit as st\nst.title('Test App 01')"
-        
-        # Mock st.error, st.warning, st.toast for non-Streamlit environment if they are called
-        # For simple tests, we might not need full mocking if logic paths avoid UI calls.
-        # However, file_utils directly calls st.error etc.
-        # A more robust approach would be to inject a UI notifier object or use a headless UI mock.
-        # For this example, we assume these calls won't break the test logic itself.
-
-        save_result = save_file(filename, content, self.test_workspace)
-        self.assertTrue(save_result, "File should be saved successfully.")
-        
-        read_content = read_file(filename, self.test_workspace)
-        self.assertEqual(content, read_content, "Read content should match saved content.")
-
-    def test_02_get_workspace_python_files(self):
-        """Test listing Python files in the workspace."""
-        save_file("app1.py", "print(1)", self.test_workspace)
-        save_file("app2.py", "print(2)", self.test_workspace)
-        save_file("script.txt", "not python", self.test_workspace) # Non-python file
-
-        py_files = get_workspace_python_files(self.test_workspace)
-        self.assertEqual(len(py_files), 2, "Should find two Python files.")
-        self.assertIn("app1.py", py_files, "app1.py should be in the list.")
-        self.assertIn("app2.py", py_files, "app2.py should be in the list.")
-        self.assertNotIn("script.txt", py_files, "script.txt should not be in the list.")
-        self.assertEqual(sorted(py_files), ["app1.py", "app2.py"], "Files should be sorted.")
-
-    def test_03_delete_file(self):
-        """Test deleting a file."""
-        filename = "to_delete.py"
-        save_file(filename, "content", self.test_workspace)
-        self.assertTrue((self.test_workspace / filename).exists(), "File should exist before delete.")
-
-        delete_result = delete_file_from_workspace(filename, self.test_workspace)
-        self.assertTrue(delete_result, "Deletion should be reported as successful.")
-        self.assertFalse((self.test_workspace / filename).exists(), "File should not exist after delete.")
-
-        # Test deleting a non-existent file (should also report success for idempotency)
-        delete_non_existent = delete_file_from_workspace("non_existent.py", self.test_workspace)
-        self.assertTrue(delete_non_existent, "Deleting non-existent file should be 'successful'.")
-
-
-    def test_04_save_file_invalid_name(self):
-        """Test saving a file with an invalid name (path traversal)."""
-        # Note: st.error will be called by save_file. In a real test suite, mock it.
-        save_result = save_file("../invalid.py", "content", self.test_workspace)
-        self.assertFalse(save_result, "Saving with path traversal should fail.")
-
-    def test_05_save_file_no_py_extension(self):
-        """Test saving a file without .py extension."""
-        save_result = save_file("test_doc.txt", "content", self.test_workspace)
-        self.assertFalse(save_result, "Saving without .py extension should fail.")
-
-    def test_06_read_non_existent_file(self):
-        """Test reading a file that does not exist."""
-        read_content = read_file("ghost.py", self.test_workspace)
-        self.assertIsNone(read_content, "Reading a non-existent file should return None.")
-
-if __name__ == '__main__':
-    # This allows running tests with `python tests/test_file_utils.py`
-    # For Streamlit context dependent functions, this might be limited.
-    # Better to run with `python -m unittest discover tests` from project root.
-    print(f"Running tests from: {os.getcwd()}")
-    print(f"Attempting to import from utils.file_utils. Current sys.path might need adjustment if run directly.")
-    unittest.main()
+import pytest
+
+from utils.file_utils import (
+    save_file, read_file, get_workspace_python_files, delete_file_from_workspace,
+    _MMAP_READ_THRESHOLD, _saved_file_digests,
+)
+
+
+@pytest.fixture
+def ws(tmp_path):
+    """A fresh, empty workspace directory per test (created and cleaned up by pytest)."""
+    return tmp_path
+
+
+def test_save_and_read_file(ws):
+    """Test saving a file and then reading it."""
+    filename = "test_app_01.py"
+    content = "import streamlit as st\nst.title('Test App 01')"
+
+    # file_utils only notifies the UI on a best-effort basis, so no Streamlit runtime is needed here.
+    assert save_file(filename, content, ws), "File should be saved successfully."
+    assert read_file(filename, ws) == content, "Read content should match saved content."
+
+
+def test_overwrite_same_length_is_read_back(ws):
+    """Test that rewriting a file with same-length content is not served from the read cache."""
+    assert save_file("same.py", "AAAA", ws)
+    assert read_file("same.py", ws) == "AAAA"
+    assert save_file("same.py", "BBBB", ws)
+    assert read_file("same.py", ws) == "BBBB", "Read should return the new content, not a cached copy."
+
+
+def test_save_file_is_atomic(ws):
+    """Test that saving (including overwriting) leaves no temporary files behind."""
+    assert save_file("atomic.py", "print(1)", ws)
+    assert save_file("atomic.py", "print('overwritten')", ws)
+    assert sorted(path.name for path in ws.iterdir()) == ["atomic.py"], "No '.tmp' file should remain."
+    assert (ws / "atomic.py").read_text() == "print('overwritten')"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permission bits and symlinks")
+def test_save_file_keeps_mode_and_symlink(ws):
+    """Test that overwriting keeps the file's permission bits and writes through symlinks."""
+    assert save_file("private.py", "print(1)", ws)
+    os.chmod(ws / "private.py", 0o600)
+    assert save_file("private.py", "print(2)", ws)
+    assert (ws / "private.py").stat().st_mode & 0o777 == 0o600, "Permission bits should be preserved."
+
+    (ws / "link.py").symlink_to(ws / "private.py")
+    assert save_file("link.py", "print(3)", ws)
+    assert (ws / "link.py").is_symlink(), "The symlink should not be replaced by a regular file."
+    assert (ws / "private.py").read_text() == "print(3)", "The symlink target should receive the new content."
+
+
+def test_save_unchanged_file_skips_write(ws):
+    """Test that re-saving identical content doesn't rewrite the file, but external edits are not masked."""
+    assert save_file("same.py", "print(1)", ws)
+    inode = (ws / "same.py").stat().st_ino
+    assert save_file("same.py", "print(1)", ws), "Unchanged save should still report success."
+    assert (ws / "same.py").stat().st_ino == inode, "Unchanged content should not be rewritten."
+
+    (ws / "same.py").write_text("edited outside the app")
+    assert save_file("same.py", "print(1)", ws)
+    assert (ws / "same.py").read_text() == "print(1)", "An external edit should not be mistaken for unchanged content."
+
+
+def test_relative_and_absolute_workspace_share_digests(ws, monkeypatch):
+    """Test that relative and absolute workspace paths share one unchanged-write record per file."""
+    monkeypatch.chdir(ws.parent)
+    relative_ws = ws.name
+    assert save_file("k.py", "print(1)", ws)
+    assert save_file("k.py", "print(1)", relative_ws)
+    assert str(ws / "k.py") in _saved_file_digests
+    assert os.path.join(relative_ws, "k.py") not in _saved_file_digests, "Paths should be normalized."
+
+    assert delete_file_from_workspace("k.py", relative_ws)
+    assert str(ws / "k.py") not in _saved_file_digests, "Delete should drop the record saved via the absolute path."
+
+
+def test_get_workspace_python_files(ws):
+    """Test listing Python files in the workspace."""
+    save_file("app1.py", "print(1)", ws)
+    save_file("app2.py", "print(2)", ws)
+    save_file("script.txt", "not python", ws) # Non-python file
+
+    py_files = get_workspace_python_files(ws)
+    assert len(py_files) == 2, "Should find two Python files."
+    assert "app1.py" in py_files, "app1.py should be in the list."
+    assert "app2.py" in py_files, "app2.py should be in the list."
+    assert "script.txt" not in py_files, "script.txt should not be in the list."
+    assert sorted(py_files) == ["app1.py", "app2.py"], "Files should be sorted."
+
+
+def test_listing_sees_external_create(ws):
+    """Test that a file created outside file_utils shows up in a cached listing."""
+    save_file("app1.py", "print(1)", ws)
+    os.utime(ws, ns=(0, 0)) # Age the directory so the external create below must change its mtime
+    assert get_workspace_python_files(ws) == ("app1.py",)
+
+    (ws / "external.py").write_text("print('external')")
+    assert get_workspace_python_files(ws) == ("app1.py", "external.py"), "Listing cache should be invalidated."
+
+
+def test_delete_file(ws):
+    """Test deleting a file."""
+    filename = "to_delete.py"
+    save_file(filename, "content", ws)
+    assert (ws / filename).exists(), "File should exist before delete."
+
+    assert delete_file_from_workspace(filename, ws), "Deletion should be reported as successful."
+    assert not (ws / filename).exists(), "File should not exist after delete."
+
+    # Test deleting a non-existent file (should also report success for idempotency)
+    assert delete_file_from_workspace("non_existent.py", ws), "Deleting non-existent file should be 'successful'."
+
+
+def test_save_file_invalid_name(ws):
+    """Test saving a file with an invalid name (path traversal)."""
+    assert not save_file("../invalid.py", "content", ws), "Saving with path traversal should fail."
+
+
+def test_save_file_no_py_extension(ws):
+    """Test saving a file without .py extension."""
+    assert not save_file("test_doc.txt", "content", ws), "Saving without .py extension should fail."
+
+
+def test_read_small_file_translates_newlines(ws):
+    """Test that the small-file read path translates CRLF and CR newlines like text-mode open()."""
+    (ws / "crlf.py").write_bytes(b"a = 1\r\nb = 2\rc = 3\n")
+    assert read_file("crlf.py", ws) == "a = 1\nb = 2\nc = 3\n"
+
+
+def test_read_large_file(ws):
+    """Test reading a file large enough to be memory-mapped, with CRLF and CR newlines."""
+    line = "x = '" + "a" * 60 + "'"
+    raw = (line + "\r\n" + line + "\r") * (_MMAP_READ_THRESHOLD // len(line))
+    (ws / "big.py").write_bytes(raw.encode("utf-8"))
+    assert (ws / "big.py").stat().st_size >= _MMAP_READ_THRESHOLD, "Fixture should take the mmap path."
+
+    expected = (line + "\n" + line + "\n") * (_MMAP_READ_THRESHOLD // len(line))
+    assert read_file("big.py", ws) == expected, "Newlines should be translated to '\\n'."
+
+
+def test_read_non_existent_file(ws):
+    """Test reading a file that does not exist."""
+    assert read_file("ghost.py", ws) is None, "Reading a non-existent file should return None."
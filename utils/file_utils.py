@@ -1,36 +1,116 @@
 # utils/file_utils.py
+import functools
+import hashlib
+import mmap
 import os
+import re
+import stat
+import threading
 from pathlib import Path
-import streamlit as st # For st.error/warning/toast in user-facing messages
 from utils.logger import app_logger
 # WORKSPACE_DIR is imported where needed or passed as an argument.
 # from config.settings import WORKSPACE_DIR # Avoid circular import if utils are used by config
 
-def get_workspace_python_files(workspace_dir: Path) -> list[str]:
+# --- User-facing notifications ---
+# Streamlit is imported on first use so that importing this module (e.g. from tests or
+# scripts) doesn't pay for loading it. Outside a running app, Streamlit itself turns these
+# calls into no-ops with a warning, so only a missing Streamlit install needs handling here.
+def _ui_notify(st_function_name: str, message: str, **kwargs):
+    """Shows `message` with st.<st_function_name> (e.g. "error", "toast"); skipped if Streamlit isn't installed."""
+    try:
+        import streamlit as st
+    except ImportError:
+        return
+    getattr(st, st_function_name)(message, **kwargs)
+
+# Basic path-traversal guard: a leading path separator or '..' anywhere in the name
+_UNSAFE_FILENAME_SEARCH = re.compile(r'\A[/\\]|\.\.').search
+
+def _is_unsafe_filename(filename: str) -> bool:
+    """Returns True if the filename could escape the workspace directory."""
+    return _UNSAFE_FILENAME_SEARCH(filename) is not None
+
+# Workspace directory -> (directory mtime_ns, sorted '.py' filenames)
+_listing_cache: dict[str, tuple[int, tuple[str, ...]]] = {}
+
+def _list_python_files(workspace_dir_str: str, dir_mtime_ns: int) -> tuple[str, ...]:
+    """
+    Lists the '.py' filenames in a directory, sorted alphabetically.
+    Cached per directory modification time, which changes whenever an entry
+    is created, renamed or removed, so the cache never serves a stale listing.
+    """
+    cached = _listing_cache.get(workspace_dir_str)
+    if cached is not None and cached[0] == dir_mtime_ns:
+        return cached[1]
+
+    # scandir's DirEntry caches the file type, so filtering needs no extra stat per entry
+    with os.scandir(workspace_dir_str) as entries:
+        names = [entry.name for entry in entries if entry.name.endswith('.py') and entry.is_file()]
+    names.sort()
+    python_files = tuple(names)
+    _listing_cache[workspace_dir_str] = (dir_mtime_ns, python_files)
+    return python_files
+
+def get_workspace_python_files(workspace_dir: Path) -> tuple[str, ...]:
     """
-    Gets a sorted list of all '.py' filenames in the specified workspace directory.
+    Gets a sorted tuple of all '.py' filenames in the specified workspace directory.
 
     Args:
         workspace_dir (Path): The path to the workspace directory.
 
     Returns:
-        list[str]: A list of Python filenames, sorted alphabetically.
-                   Returns an empty list if the directory doesn't exist or on error.
+        tuple[str, ...]: The Python filenames, sorted alphabetically.
+                         Returns an empty tuple if the directory doesn't exist or on error.
     """
-    if not workspace_dir.is_dir():
-        app_logger.warning(f"Workspace directory '{workspace_dir}' not found or is not a directory.")
-        return []
     try:
-        python_files = sorted([
-            f.name for f in workspace_dir.iterdir()
-            if f.is_file() and f.suffix == '.py'
-        ])
-        app_logger.debug(f"Found Python files in '{workspace_dir}': {python_files}")
+        dir_stat = os.stat(workspace_dir) # One syscall serves both the directory check and the cache key
+    except OSError:
+        dir_stat = None
+    if dir_stat is None or not stat.S_ISDIR(dir_stat.st_mode):
+        app_logger.warning("Workspace directory '%s' not found or is not a directory.", workspace_dir)
+        return ()
+    try:
+        python_files = _list_python_files(os.fspath(workspace_dir), dir_stat.st_mtime_ns)
+        app_logger.debug("Found Python files in '%s': %s", workspace_dir, python_files)
         return python_files
     except Exception as e:
-        st.error(f"Error reading workspace directory: {e}")
-        app_logger.error(f"Error reading workspace directory '{workspace_dir}': {e}", exc_info=True)
-        return []
+        _ui_notify("error", f"Error reading workspace directory: {e}")
+        app_logger.error("Error reading workspace directory '%s': %s", workspace_dir, e, exc_info=True)
+        return ()
+
+_MMAP_READ_THRESHOLD = 64 * 1024 # Files at least this large are decoded straight from a memory map
+# Sequential-access hint for mapped reads; None where mmap.madvise or the flag is unavailable (e.g. Windows)
+_MADV_SEQUENTIAL = getattr(mmap, "MADV_SEQUENTIAL", None) if hasattr(mmap.mmap, "madvise") else None
+
+def _decode_text(data) -> str:
+    """
+    Decodes UTF-8 file bytes (or any buffer), applying the universal-newline translation
+    that text-mode open() would, so all read paths return identical text.
+    """
+    text = str(data, "utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+@functools.lru_cache(maxsize=64)
+def _read_text_file(filepath_str: str, inode: int, mtime_ns: int, size: int) -> str:
+    """
+    Reads a UTF-8 text file. Cached per (path, inode, mtime, size), so a changed file is re-read;
+    save_file replaces files with a new inode and clears the cache, so its writes are never masked
+    by coarse mtime granularity.
+    Small files are read with a single os.read (no TextIOWrapper); large files are
+    memory-mapped and decoded from the mapping, skipping the buffered-IO copy.
+    """
+    fd = os.open(filepath_str, os.O_RDONLY)
+    try:
+        if size < _MMAP_READ_THRESHOLD:
+            return _decode_text(os.read(fd, os.fstat(fd).st_size))
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+            if _MADV_SEQUENTIAL is not None: # Larger kernel readahead for the front-to-back decode
+                mapped.madvise(_MADV_SEQUENTIAL)
+            return _decode_text(mapped)
+    finally:
+        os.close(fd)
 
 def read_file(filename: str, workspace_dir: Path) -> str | None:
     """
@@ -47,73 +127,143 @@ def read_file(filename: str, workspace_dir: Path) -> str | None:
     if not filename:
         app_logger.warning("Read attempt with no filename provided.")
         return None
-    # Basic security check to prevent path traversal
-    if ".." in filename or filename.startswith(("/", "\\")):
-        st.error(f"Invalid file path: {filename}")
-        app_logger.error(f"Invalid file path attempted for reading: {filename}")
+    if _is_unsafe_filename(filename):
+        _ui_notify("error", f"Invalid file path: {filename}")
+        app_logger.error("Invalid file path attempted for reading: %s", filename)
         return None
 
     filepath = workspace_dir / filename
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read()
-        app_logger.info(f"File '{filepath}' read successfully.")
+        file_stat = filepath.stat()
+        content = _read_text_file(str(filepath), file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+        app_logger.debug("File '%s' read OK (%d bytes)", filepath, file_stat.st_size)
         return content
     except FileNotFoundError:
-        st.warning(f"File not found: {filename}")
-        app_logger.warning(f"File not found during read attempt: {filepath}")
+        _ui_notify("warning", f"File not found: {filename}")
+        app_logger.warning("File not found during read attempt: %s", filepath)
         return None
     except Exception as e:
-        st.error(f"Error reading file '{filename}': {e}")
-        app_logger.error(f"Error reading file '{filepath}': {e}", exc_info=True)
+        _ui_notify("error", f"Error reading file '{filename}': {e}")
+        app_logger.error("Error reading file '%s': %s", filepath, e, exc_info=True)
         return None
 
-def save_file(filename: str, content: str, workspace_dir: Path) -> bool:
+# Workspace directories already created/verified by save_file in this process
+_known_workspace_dirs: set[str] = set()
+
+# File path -> ((inode, mtime_ns, ctime_ns, size) right after we saved it, BLAKE2b digest of what we saved)
+_saved_file_digests: dict[str, tuple[tuple[int, int, int, int], bytes]] = {}
+
+def _file_signature(filepath: str) -> tuple[int, int, int, int] | None:
+    """Returns the (inode, mtime_ns, ctime_ns, size) of a file, or None if it can't be stat'ed."""
+    try:
+        file_stat = os.stat(filepath)
+    except OSError:
+        return None
+    return file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_ctime_ns, file_stat.st_size
+
+def _write_file_atomically(filepath: str, data: bytes):
+    """
+    Writes bytes to a temporary file with unbuffered os.write calls, fsyncs it, then renames it
+    over `filepath`. Readers see either the old or the new content, never a truncated file, and
+    a crash can't leave a partial write behind. A symlinked `filepath` is written through to its
+    target, and an existing file keeps its permission bits.
+    """
+    target_filepath = os.path.realpath(filepath)
+    # Unique per writer thread, and not a '.py' name, so it never shows up in the file list
+    tmp_filepath = f"{target_filepath}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        target_mode = stat.S_IMODE(os.stat(target_filepath).st_mode)
+    except FileNotFoundError:
+        target_mode = None # New file: os.open's 0o666 minus the umask, as open(..., "w") would
+    fd = os.open(tmp_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        try:
+            if target_mode is not None and hasattr(os, "fchmod"):
+                os.fchmod(fd, target_mode)
+            remaining = memoryview(data)
+            while remaining:
+                remaining = remaining[os.write(fd, remaining):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_filepath, target_filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_filepath)
+        except OSError:
+            pass
+        raise
+
+def save_file(filename: str, content: str, workspace_dir: str | Path) -> bool:
     """
     Writes text content to a file in the workspace. Overwrites if the file exists.
 
     Args:
         filename (str): The name of the file to save.
         content (str): The text content to write to the file.
-        workspace_dir (Path): The path to the workspace directory.
+        workspace_dir (str | Path): The path to the workspace directory.
 
     Returns:
         bool: True if saving was successful, False otherwise.
     """
     if not filename:
         app_logger.warning("Save attempt with no filename provided.")
-        st.error("Cannot save: Filename is missing.")
+        _ui_notify("error", "Cannot save: Filename is missing.")
         return False
-    if ".." in filename or filename.startswith(("/", "\\")):
-        st.error(f"Invalid file path: {filename}")
-        app_logger.error(f"Invalid file path attempted for saving: {filename}")
+    if _is_unsafe_filename(filename):
+        _ui_notify("error", f"Invalid file path: {filename}")
+        app_logger.error("Invalid file path attempted for saving: %s", filename)
         return False
     if not filename.endswith(".py"): # Enforce .py extension
-        st.error(f"Invalid filename: '{filename}'. Must end with '.py'.")
-        app_logger.error(f"Save attempt with invalid extension: {filename}")
+        _ui_notify("error", f"Invalid filename: '{filename}'. Must end with '.py'.")
+        app_logger.error("Save attempt with invalid extension: %s", filename)
         return False
 
 
-    filepath = workspace_dir / filename
+    # Absolute, so relative (WORKSPACE_DIR) and absolute (WORKSPACE_DIR_STR) callers share one
+    # entry in _known_workspace_dirs and _saved_file_digests
+    workspace_dir_str = os.path.abspath(workspace_dir)
+    filepath = os.path.join(workspace_dir_str, filename)
     try:
-        # Ensure the workspace directory exists (it should, but double-check)
-        workspace_dir.mkdir(parents=True, exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(content)
-        app_logger.info(f"File '{filepath}' saved successfully.")
+        # Ensure the workspace directory exists (it should, but double-check once per directory)
+        if workspace_dir_str not in _known_workspace_dirs:
+            os.makedirs(workspace_dir_str, exist_ok=True)
+            _known_workspace_dirs.add(workspace_dir_str)
+        data = content.encode("utf-8") # Encoded once; hashed and written without a TextIOWrapper
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        # Skip the write if we last saved exactly this content and the file looks untouched since
+        # (same inode, mtime, ctime and size). Replacing or resizing the file, or writing to it in a
+        # later timestamp tick, is detected; a same-size in-place edit within one tick is not.
+        recorded = _saved_file_digests.get(filepath)
+        if recorded is not None and recorded[1] == digest and recorded[0] == _file_signature(filepath):
+            app_logger.debug("File '%s' unchanged; skipped writing.", filepath)
+            return True
+        try:
+            _write_file_atomically(filepath, data)
+        except FileNotFoundError: # Workspace removed since it was verified; re-create it and retry once
+            os.makedirs(workspace_dir_str, exist_ok=True)
+            _write_file_atomically(filepath, data)
+        _read_text_file.cache_clear()
+        file_signature = _file_signature(filepath)
+        if file_signature is not None:
+            _saved_file_digests[filepath] = (file_signature, digest)
+        app_logger.debug("File '%s' saved OK (%d bytes)", filepath, len(data))
+        _listing_cache.clear() # Don't rely on directory mtime granularity for new files
         return True
     except Exception as e:
-        st.error(f"Error saving file '{filename}': {e}")
-        app_logger.error(f"Error saving file '{filepath}': {e}", exc_info=True)
+        _ui_notify("error", f"Error saving file '{filename}': {e}")
+        app_logger.error("Error saving file '%s': %s", filepath, e, exc_info=True)
         return False
 
-def delete_file_from_workspace(filename: str, workspace_dir: Path) -> bool:
+def delete_file_from_workspace(filename: str, workspace_dir: str | Path, show_toast: bool = True) -> bool:
     """
     Deletes a file from the workspace.
 
     Args:
         filename (str): The name of the file to delete.
-        workspace_dir (Path): The path to the workspace directory.
+        workspace_dir (str | Path): The path to the workspace directory.
+        show_toast (bool): Whether to show a "Deleted" toast. Callers that batch several
+                           deletions pass False and report them together.
 
     Returns:
         bool: True if deletion was successful or file didn't exist, False on error.
@@ -123,27 +273,31 @@ def delete_file_from_workspace(filename: str, workspace_dir: Path) -> bool:
     """
     if not filename:
         app_logger.warning("Delete attempt with no filename provided.")
-        st.error("Cannot delete: Filename is missing.")
+        _ui_notify("error", "Cannot delete: Filename is missing.")
         return False
-    if ".." in filename or filename.startswith(("/", "\\")):
-        st.error(f"Invalid file path: {filename}")
-        app_logger.error(f"Invalid file path attempted for deletion: {filename}")
+    if _is_unsafe_filename(filename):
+        _ui_notify("error", f"Invalid file path: {filename}")
+        app_logger.error("Invalid file path attempted for deletion: %s", filename)
         return False
 
-    filepath = workspace_dir / filename
+    filepath = os.path.join(os.path.abspath(workspace_dir), filename) # Same spelling as save_file's digest keys
     try:
-        if filepath.is_file():
+        if os.path.isfile(filepath):
             os.remove(filepath)
-            st.toast(f"Deleted: {filename}", icon="🗑️")
-            app_logger.info(f"File '{filepath}' deleted successfully.")
+            _saved_file_digests.pop(filepath, None)
+            _read_text_file.cache_clear()
+            if show_toast:
+                _ui_notify("toast", f"Deleted: {filename}", icon="🗑️")
+            app_logger.info("File '%s' deleted successfully.", filepath)
+            _listing_cache.clear()
             return True
         else:
-            st.warning(f"Could not delete: File '{filename}' not found.")
-            app_logger.warning(f"File not found during delete attempt: {filepath}")
+            _ui_notify("warning", f"Could not delete: File '{filename}' not found.")
+            app_logger.warning("File not found during delete attempt: %s", filepath)
             return True # Considered success if file doesn't exist for idempotency
     except Exception as e:
-        st.error(f"Error deleting file '{filename}': {e}")
-        app_logger.error(f"Error deleting file '{filepath}': {e}", exc_info=True)
+        _ui_notify("error", f"Error deleting file '{filename}': {e}")
+        app_logger.error("Error deleting file '%s': %s", filepath, e, exc_info=True)
         return False
 
 if __name__ == "__main__":
@@ -1,7 +1,13 @@
 # utils/logger.py
+import atexit
 import logging
+import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+# Background listeners that perform the actual handler IO, one per configured logger name
+_queue_listeners: dict[str, QueueListener] = {}
 
 def setup_logger(
     name: str = "streamlit_ai_app_gen",
@@ -13,6 +19,10 @@ def setup_logger(
     """
     Configures and returns a logger instance with console and rotating file handlers.
 
+    The logger itself only has a QueueHandler, so logging calls just enqueue the record.
+    A background QueueListener thread formats records and writes them to the console
+    and file handlers, keeping that IO off the Streamlit script thread.
+
     Args:
         name (str): The name of the logger.
         log_file (str): The name of the log file.
@@ -28,6 +38,10 @@ def setup_logger(
     # Prevent adding multiple handlers if logger is already configured
     if logger.hasHandlers():
         logger.handlers.clear() # Clear existing handlers to reconfigure if needed
+    previous_listener = _queue_listeners.pop(name, None)
+    if previous_listener:
+        atexit.unregister(previous_listener.stop)
+        previous_listener.stop()
 
     logger.setLevel(level)
 
@@ -40,21 +54,37 @@ def setup_logger(
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    output_handlers = [console_handler]
 
     # Rotating File Handler
-    try:
+    # The file is only opened on the first record, so check up front that it can be written;
+    # otherwise every record would fail in the listener thread. Continue without file logging then.
+    log_dir = os.path.dirname(os.path.abspath(log_file))
+    if os.path.exists(log_file):
+        file_writable = os.access(log_file, os.W_OK) and os.access(log_dir, os.W_OK) # Rotation renames within log_dir
+    else:
+        file_writable = os.path.isdir(log_dir) and os.access(log_dir, os.W_OK)
+    if file_writable:
         file_handler = RotatingFileHandler(
             log_file,
             maxBytes=max_bytes,
             backupCount=backup_count,
-            encoding='utf-8'
+            encoding='utf-8',
+            delay=True # Open the log file on the first record, not at import time
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    except Exception as e:
-        logger.error(f"Failed to set up file handler for {log_file}: {e}", exc_info=True)
-        # Continue without file logging if it fails
+        output_handlers.append(file_handler)
+
+    # Queue Handler + background listener
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Flush queued records on interpreter shutdown
+    _queue_listeners[name] = listener
+
+    if not file_writable:
+        logger.error(f"Failed to set up file handler for {log_file}: log location is not writable")
 
     # Set propagation to False to avoid duplicate logs if other loggers (e.g., root logger) are configured
     logger.propagate = False
@@ -1,6 +1,7 @@
 # utils/session_manager.py
 import streamlit as st
 from utils.logger import app_logger
+from config.settings import CHAT_HISTORY_WINDOW
 
 def initialize_session_state():
     """
@@ -18,13 +19,13 @@ def initialize_session_state():
         "editor_unsaved_content": "", # Current text typed into the editor by the user
         "last_saved_content": "",   # Content that was last successfully saved to disk (by user or AI)
         "ai_is_thinking": False,    # Flag to manage AI processing state
+        "chat_history_window": CHAT_HISTORY_WINDOW, # Number of most recent chat messages rendered in the sidebar
     }
 
     # Initialize only if keys are not already present
     for key, default_value in state_defaults.items():
-        if key not in st.session_state:
-            st.session_state[key] = default_value
-            app_logger.debug(f"Initialized session state key '{key}' with default value.")
+        st.session_state.setdefault(key, default_value)
+    app_logger.debug("Session state checked against %d defaults.", len(state_defaults))
 
     app_logger.info("Session state initialized or verified.")
 